@@ -1,11 +1,19 @@
 import inspect
+import time
 import traceback
 
-from renus.core.cache import Cache
-from renus.core.concurrency import run_in_threadpool
+import anyio
+
+from renus.core.admission import Admission
+from renus.core.concurrency import (
+    current_limiter, get_limiter, limiter_stats, run_in_process, run_in_threadpool,
+    run_in_threadpool_abandon, shutdown_process_pool,
+)
 from renus.core.config import Config
+from renus.core.datastructures import Background
 from renus.core.exception import debug_response
-from renus.core.middleware import Middleware
+from renus.core.log import Log
+from renus.core.middleware import Middleware, compose
 from renus.core.request import Request
 from renus.core.response import Response, TextResponse, JsonResponse
 from renus.core.routing import RouteRegistry
@@ -17,11 +25,33 @@ class App:
     def __init__(self, lifespan=None,
                  on_startup=None,
                  on_shutdown=None, middlewares: list = None) -> None:
+        """
+        :param on_startup: handlers run in list order before serving, a
+            tuple entry is a group of independent handlers run concurrently:
+            on_startup=[connect_db, (warm_cache, load_settings)]
+        :param on_shutdown: handlers run the same way after draining
+        :param middlewares: run before every route's own middlewares
+        """
         self.debug = Config('app').get('debug', False)
         self.env = Config('app').get('env', 'local')
         self.on_startup = [] if on_startup is None else list(on_startup)
         self.on_shutdown = [] if on_shutdown is None else list(on_shutdown)
         self.middlewares = [] if middlewares is None else middlewares
+        RouteRegistry().memoize(Config('app').get('route_memo_size', 0))
+        self.middleware_threadpool = Config('app').get('middleware_threadpool', False)
+        # route plan -> app middlewares + route middlewares, for _registry
+        self._chains = {}
+        self._registry = None
+        self.shutdown_grace = Config('app').get('shutdown_grace', 30)
+        self.timeout = Config('app').get('timeout', None)
+        max_concurrency = Config('app').get('max_concurrency', None)
+        self.admission = Admission(
+            max_concurrency,
+            Config('app').get('max_queue', None),
+            Config('app').get('queue_timeout', 0.5),
+        ) if max_concurrency else None
+        self.draining = False
+        self.inflight_by_type = {'http': 0, 'websocket': 0}
 
         async def default_lifespan(app):
             await self.startup()
@@ -57,12 +87,14 @@ class App:
                     first = False
                     await send({"type": "lifespan.startup.complete"})
                     await receive()
+                    await self.drain()
             else:
                 for item in self.lifespan_context(app):  # type: ignore
                     assert first, "Lifespan context yielded multiple times."
                     first = False
                     await send({"type": "lifespan.startup.complete"})
                     await receive()
+                    await self.drain()
         except BaseException:
             if first:
                 exc_text = traceback.format_exc()
@@ -72,32 +104,49 @@ class App:
         else:
             await send({"type": "lifespan.shutdown.complete"})
 
+    @property
+    def in_flight(self) -> dict:
+        res = {**self.inflight_by_type, 'background': Background.running, 'draining': self.draining,
+               'threads': limiter_stats()}
+        if self.admission is not None:
+            res['admission'] = self.admission.stats()
+        return res
+
+    async def drain(self) -> None:
+        """
+        Refuse new work and wait up to `shutdown_grace` seconds for the
+        running requests, websocket sessions and background tasks.
+        """
+        self.draining = True
+        start = time.perf_counter()
+        with anyio.move_on_after(self.shutdown_grace):
+            while self.inflight_by_type['http'] or self.inflight_by_type['websocket'] or Background.running:
+                await anyio.sleep(0.05)
+        state = self.in_flight
+        Log().info(f'drained in {time.perf_counter() - start:.3f}s, left: {state}')
+
     async def websocket(self, scope, receive, send) -> None:
         scope["method"] = 'WS'
         ws = WebSocket(scope, receive, send)
 
+        if self.draining:
+            await ws.close(1001)
+            return
+
+        self.inflight_by_type['websocket'] += 1
         try:
             res = self.load_routes(ws, scope)
             setattr(ws, 'route', res)
             if not res:
                 await ws.close(1004)
             else:
-                middlewares = self.middlewares + res['middlewares']
-                passed = Middleware(ws, middlewares).next()
+                passed = await Middleware(ws, chain=self.chain(res)).run()
 
                 if passed is not True:
                     await ws.close(1003)
                     return
 
-                if res["controller"] is not None:
-                    if 'request' in inspect.getfullargspec(res["controller"].__init__).args:
-                        controller = res["controller"](ws)
-                    else:
-                        controller = res["controller"]()
-                    method = getattr(controller, res['func'])
-                else:
-                    method = res['func']
-
+                method = res['plan'].bind(ws)
                 res['args']['ws'] = ws
 
                 await method(**res['args'])
@@ -106,11 +155,18 @@ class App:
             debug_response(exc, self.debug)
             if self.env == 'local':
                 raise
+        finally:
+            self.inflight_by_type['websocket'] -= 1
 
     async def http(self, scope, receive, send):
         scope["method"] = scope["method"].upper()
         request = Request(scope, receive)
 
+        if self.draining:
+            await self.result(request, unavailable({'connection': 'close'}), scope, receive, send)
+            return
+
+        self.inflight_by_type['http'] += 1
         try:
             await self.view(request, scope, receive, send)
         except Exception as exc:
@@ -118,6 +174,8 @@ class App:
             await self.result(request, JsonResponse(*debug), scope, receive, send)
             if self.env == 'local':
                 raise
+        finally:
+            self.inflight_by_type['http'] -= 1
 
     async def view(self, request, scope, receive, send):
         res = self.load_routes(request, scope)
@@ -125,77 +183,210 @@ class App:
 
         if not res:
             await self.result(request, TextResponse('Path not Found', Status.HTTP_404_NOT_FOUND), scope, receive, send)
-        else:
-            middlewares = self.middlewares + res['middlewares']
-            passed = Middleware(request, middlewares).next()
+            return
+
+        held = await self.admit(res)
+        if held is None:
+            await self.result(request, unavailable(), scope, receive, send)
+            return
+
+        timeout = res['timeout'] or self.timeout
+        if timeout:
+            request.deadline = time.monotonic() + timeout
+
+        start = time.perf_counter()
+        error = True
+        token = current_limiter.set(res['limiter'])
+        try:
+            passed = await Middleware(request, chain=self.chain(res)).run()
 
             if passed is not True:
-                await self.result(request, passed, scope, receive, send)
+                r = passed
             else:
                 if scope["method"] in ['POST', 'PUT', 'DELETE']:
-                    await request.form_safe()
-                if res["controller"] is not None:
-                    if 'request' in inspect.getfullargspec(res["controller"].__init__).args:
-                        controller = res["controller"](request)
-                    else:
-                        controller = res["controller"]()
-                    method = getattr(controller, res['func'])
+                    await self.read_body(request, res['body'])
+                plan = res['plan']
+                if res['executor'] == 'process':
+                    method = plan.target()
                 else:
-                    method = res['func']
-
-                if 'request' in method.__code__.co_varnames:
+                    method = plan.bind(request)
+                if plan.wants_request:
                     res['args']['request'] = request
 
                 r = await self.function(res, request, method)
 
-                await self.result(request, r, scope, receive, send)
+            await self.result(request, r, scope, receive, send)
+            # only now: a failure while sending the response is an error
+            error = getattr(r, 'status_code', 200) >= 500
+        finally:
+            current_limiter.reset(token)
+            res['stats'].record(time.perf_counter() - start, error)
+            for admission in held:
+                admission.release()
+
+    async def admit(self, res):
+        """
+        take a slot of the global then the route limit
+        :return: the admissions to release, None when the request is shed
+        """
+        held = []
+        try:
+            for admission in (self.admission, res['admission']):
+                if admission is None:
+                    continue
+                if not await admission.acquire():
+                    for h in held:
+                        h.release()
+                    return None
+                held.append(admission)
+        except BaseException:
+            # cancelled while queued for the route, give back the global slot
+            for h in held:
+                h.release()
+            raise
+        return held
+
+    async def read_body(self, request, mode):
+        if mode == 'safe':
+            await request.form_safe()
+        elif mode == 'lazy':
+            await request.form_lazy()
+        elif mode == 'raw':
+            await request.body()
 
     async def function(self, res, request, method):
+        if request.deadline is None:
+            return await self.call(res, request, method)
+
+        try:
+            with anyio.fail_after(request.remaining) as scope:
+                return await self.call(res, request, method)
+        except TimeoutError:
+            if not scope.cancel_called:
+                raise
+            return JsonResponse({'msg': 'Gateway Timeout'}, Status.HTTP_504_GATEWAY_TIMEOUT)
+
+    async def call(self, res, request, method):
         async def get_async():
-            if inspect.iscoroutinefunction(method):
+            if res['plan'].is_async:
                 return await method(**res['args'])
+            elif res['executor'] == 'process':
+                return await run_in_process(method, **res['args'])
+            elif request.deadline is not None:
+                return await run_in_threadpool_abandon(method, **res['args'])
             else:
                 return await run_in_threadpool(method, **res['args'])
 
         if res['cache']:
-            c = Cache(use_hash=True).get(request.full_path, None)
-
-            if c is None:
-                r = await get_async()
-                Cache(use_hash=True).put(request.full_path, r, res['cache'])
-            else:
-                r = c
-                r.raw_headers.append((b'r-cache', b'ok'))
-        else:
-            r = await get_async()
-        return r
+            return await res['cache'].fetch(request, get_async)
+        return await get_async()
 
     async def startup(self) -> None:
         """
         Run any `.on_startup` event handlers.
         """
         print('application startup')
-        for handler in self.on_startup:
-            if inspect.isasyncgenfunction(handler):
-                await handler()
-            else:
-                handler()
+        await self.run_handlers(self.on_startup, Config('app').get('startup_timeout', None))
+        self.compose_middlewares()
+
+        registry = RouteRegistry()
+        if not registry.frozen and registry.compile():
+            print(registry.report())
+
+        # fail on a route limiter missing from thread_limiters before serving
+        get_limiter('default')
+        for methods in registry.all.values():
+            for routes in methods.values():
+                for route in routes:
+                    get_limiter(route.get('limiter'))
 
     async def shutdown(self) -> None:
         """
         Run any `.on_shutdown` event handlers.
         """
         print('application shutdown')
-        for handler in self.on_shutdown:
-            if inspect.isasyncgenfunction(handler):
-                await handler()
+        await self.run_handlers(self.on_shutdown, Config('app').get('shutdown_timeout', None), False)
+        shutdown_process_pool()
+
+    async def run_handlers(self, handlers, timeout=None, fail_fast=True) -> None:
+        """
+        Run event handlers one after another in list order, sync ones in
+        threads. A tuple or list entry is a group of independent handlers
+        run concurrently, the next entry starts when the whole group is done:
+        on_startup=[connect_db, (warm_cache, load_settings), create_indexes]
+        Each is bounded by `timeout` seconds (or its own `timeout`
+        attribute); a sync handler that times out is abandoned, its thread
+        runs on to the end.
+        :param fail_fast: stop on the first error, else log it and go on
+        """
+        async def call(handler):
+            name = getattr(handler, '__qualname__', repr(handler))
+            start = time.perf_counter()
+            try:
+                with anyio.fail_after(getattr(handler, 'timeout', timeout)):
+                    if inspect.iscoroutinefunction(handler) or \
+                            inspect.iscoroutinefunction(getattr(handler, '__call__', None)):
+                        r = handler()
+                    else:
+                        r = await run_in_threadpool_abandon(handler)
+                    if inspect.isawaitable(r):
+                        await r
+            except Exception as exc:
+                Log().error(f'{name} failed after {time.perf_counter() - start:.3f}s: {exc!r}')
+                if fail_fast:
+                    raise
+            else:
+                elapsed = time.perf_counter() - start
+                Log().info(f'{name} done in {elapsed:.3f}s')
+                print(f'  {name} {elapsed * 1000:.1f} ms')
+
+        for entry in handlers:
+            if isinstance(entry, (tuple, list)):
+                async with anyio.create_task_group() as task_group:
+                    for handler in entry:
+                        task_group.start_soon(call, handler)
             else:
-                handler()
+                await call(entry)
 
     async def result(self, request, response, scope, receive, send):
         if not isinstance(response, Response):
             response = TextResponse(response)
         await response(request, scope, receive, send)
 
+    def add_middleware(self, middleware) -> None:
+        """add an app wide middleware, run before every route's own"""
+        self.middlewares.append(middleware)
+        self.compose_middlewares()
+
+    def compose_middlewares(self) -> None:
+        """
+        precompose the chain of every registered route, done on startup;
+        call it again after changing app.middlewares in place
+        """
+        self._registry = RouteRegistry()
+        self._chains = {}
+        for methods in self._registry.all.values():
+            for routes in methods.values():
+                for route in routes:
+                    self.chain(route)
+
+    def chain(self, route) -> tuple:
+        """composed middlewares of a route, routes added after startup are composed on first use"""
+        chain = self._chains.get(route['plan'])
+        if chain is None:
+            chain = compose(self.middlewares + route['middlewares'], self.middleware_threadpool)
+            self._chains[route['plan']] = chain
+        return chain
+
     def load_routes(self, req, scope):
-        return RouteRegistry().resolve(req, scope)
+        registry = RouteRegistry()
+        if registry is not self._registry:
+            # RouteRegistry.reset(), the chains are of routes that are gone
+            self._registry = registry
+            self._chains = {}
+        return registry.resolve(req, scope)
+
+
+def unavailable(headers: dict = None):
+    return TextResponse('Service Unavailable', Status.HTTP_503_SERVICE_UNAVAILABLE,
+                        {'retry-after': '1', **(headers or {})})
@@ -0,0 +1,151 @@
+"""
+Differential fuzz of Injection.escape against the sanitiser as it was
+before the no-markup fast path and the LRU cache: both must return the
+same string for every input. The baseline below is a frozen copy, do
+not change it along with renus.core.injection.
+"""
+import random
+from html import unescape
+from html.parser import HTMLParser
+
+ATOMS = [
+    'a', 'Z', '1', ' ', '\t', '\n', '\r', '<', '>', '&', '"', "'", ';', '#', '/', '=', ':',
+    'é', '漢', '\x00', '&amp;', '&lt;', '&#39;', '&#x27;', '&nbsp', '<b>', '</b>', '<script>',
+    '</script>', '<img src="x" onerror=1>', '<a href=javascript:x>', '<!--', '-->', '<![CDATA[',
+    ']]>', '<?', '<style>', 'http://', '//x', '<meta charset=u>', '<br/>', '<p class="c" id=i>',
+]
+
+
+def baseline_escape(value: str) -> str:
+    parser = BaselineXss()
+    parser.feed(unescape(value))
+    parser.close()
+    return parser.getEscaped().strip()
+
+
+def sample(rnd: random.Random) -> str:
+    s = ''.join(rnd.choice(ATOMS) for _ in range(rnd.randint(0, 30)))
+    if rnd.random() < 0.5:
+        # half the cases without markup, they take the fast path
+        s = s.replace('<', '').replace('&', '')
+    return s
+
+
+def fuzz(cases: int, seed: int = 0) -> list:
+    """
+    run `cases` random strings with the cache off, then again with a
+    small cache so hits are compared too
+    :return: mismatches as (input, baseline, current)
+    """
+    from renus.core.injection import Injection
+
+    size, max_length = Injection.cache_size, Injection.cache_max_length
+    failed = []
+    try:
+        for cache in (0, 50):
+            Injection.memoize(cache, 40)
+            rnd = random.Random(seed)
+            for _ in range(cases):
+                s = sample(rnd)
+                old, new = baseline_escape(s), Injection().escape(s)
+                if old != new:
+                    failed.append((s, old, new))
+    finally:
+        Injection.memoize(size, max_length)
+    return failed
+
+
+class BaselineXss(HTMLParser):
+    block_tags = {
+        'script': 'scripts',
+        'iframe':'iframes',
+        'object':'objects',
+        'embed':'embeds',
+        'form':'forms',
+        'style':'styles',
+        'base':'bases',
+        'link':'links', 
+        'applet':'applets', 
+        'meta':'metas'
+    }
+    allow_protocol=['http','https']
+    allow_attr = {'class':1,
+                  'id':1,
+                  'http-equiv': ['meta'],
+                  'content': ['meta'],
+                  'name': ['meta'],
+                  'charset': ['meta'],
+                  'href':['a'],
+                  'target':['a'],
+                  'alt':['img'],
+                  'width':['img','video'],
+                  'height':['img','video'],
+                  'controls':['video'],
+                  'src':['img','video']
+                  }
+    no_end_tags = ["img", "hr", "br", "embed", "meta"]
+
+    def __init__(self):
+        HTMLParser.__init__(self)
+        self.result = []
+        self.start_list = []
+
+    def getEscaped(self):
+        return self._htmlspecialchars(''.join(self.result))
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.block_tags:
+            tag = self.block_tags[tag]
+        end_diagonal = ' /' if tag in self.no_end_tags else ''
+        if not end_diagonal:
+            self.start_list.append(tag)
+        attdict = {}
+        for attr in attrs:
+            if attr[0] in self.allow_attr:
+                if self.allow_attr[attr[0]]==1 or tag in self.allow_attr[attr[0]]:
+                    attdict[attr[0]] =self._is_valid(attr)
+
+        attrs = []
+        for (key, value) in attdict.items():
+            attrs.append('%s="%s"' % (key, self._htmlspecialchars(value)))
+        attrs = (' ' + ' '.join(attrs)) if attrs else ''
+        self.result.append('&lt;' + tag + attrs + end_diagonal + '&gt;')
+
+    def handle_endtag(self, tag):
+        if tag in self.block_tags:
+            tag = self.block_tags[tag]
+        if self.start_list and tag == self.start_list[len(self.start_list) - 1]:
+            self.result.append('&lt;/' + tag + '&gt;')
+            self.start_list.pop()
+
+    def handle_data(self, data):
+        self.result.append(self._htmlspecialchars(data))
+
+    def handle_entityref(self, name):
+        if name.isalpha():
+            self.result.append("&%s;" % name)
+
+    def handle_charref(self, name):
+        if name.isdigit():
+            self.result.append("&#%s;" % name)
+
+    def _is_valid(self,attr):
+        if attr[0] in ['href','src']:
+            if str(attr[1]).find(':') !=-1:
+                has =False
+                for item in self.allow_protocol:
+                    if str(attr[1]).startswith(item):
+                        has=True
+                if has is False:
+                    return 'http://%s' % str(attr[1])
+            elif str(attr[1]).startswith('//'):
+                return 'http:%s' % str(attr[1])
+        return attr[1]
+    def _htmlspecialchars(self, html):
+        return html.replace("<", "&lt;") \
+            .replace(">", "&gt;") \
+            .replace('"', "&quot;") \
+            .replace("'", "&#039;")
@@ -0,0 +1,222 @@
+import copy
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from renus.core.routing import RouteRegistry, Router, build_path
+
+DESCRIPTION = """bench => Route resolution benchmark on 100/1k/10k synthetic routes
+bench 5000 => Only the given table size
+bench --compare => Static fast lane vs the old linear regex scan
+bench --sanitize => Sanitising a 1 MB nested JSON body, deepcopy + protect vs single pass
+bench --fuzz 100000 => Differential fuzz of Injection.escape against the frozen baseline sanitiser
+bench --save file.json => Save results as a baseline
+bench --baseline file.json => Fail if ops/sec dropped more than 10% against a baseline"""
+
+SIZES = [100, 1000, 10000]
+OID = '5f1d7a3e9c1b2a4d6e8f0a1b'
+
+
+class FakeRequest:
+    def __init__(self, method: str, subdomain: str = None) -> None:
+        self.method = method
+        self.subdomain = subdomain
+
+
+def build_table(count: int) -> dict:
+    """
+    register `count` routes through the public Router API, 40% static,
+    30% typed params, 10% deep, 10% path params and 10% on subdomains
+    :return: sample requests per case, as (request, path) pairs
+    """
+    RouteRegistry.reset()
+    api = Router('api')
+    files = Router('files')
+    get = FakeRequest('GET')
+    cases = {'static': [], 'typed': [], 'deep': [], 'subdomain': [], 'miss': []}
+
+    for i in range(count // 10):
+        api.get(f'/r{i}/list').get(f'/r{i}/settings').post(f'/r{i}/list').get(f'/r{i}/stats')
+        api.get(f'/r{i}/{{id:int}}').get(f'/r{i}/{{o:oid}}/items').put(f'/r{i}/{{o:oid}}')
+        api.get(f'/r{i}/a/b/c/{{id:int}}/d/{{slug}}/e/{{flag:bool}}')
+        files.get(f'/f{i}/{{p:path}}')
+        Router(f'/t{i}', subdomain=f'tenant{i % 10}').get('/home/{slug}')
+
+        cases['static'].append((get, f'/api/r{i}/settings'))
+        cases['typed'].append((get, f'/api/r{i}/{OID}/items'))
+        cases['deep'].append((get, f'/api/r{i}/a/b/c/{i}/d/name-{i}/e/true'))
+        cases['subdomain'].append((FakeRequest('GET', f'tenant{i % 10}'), f'/t{i}/home/welcome'))
+        cases['miss'].append((get, f'/api/r{i}/unknown/path/{i}'))
+    return cases
+
+
+def measure(registry, samples: list, budget: float) -> dict:
+    timings = []
+    resolve = registry.resolve
+    clock = time.perf_counter_ns
+    end = time.perf_counter() + budget
+    while time.perf_counter() < end:
+        for request, path in samples:
+            scope = {'path': path}
+            start = clock()
+            resolve(request, scope)
+            timings.append(clock() - start)
+
+    timings.sort()
+    total = sum(timings)
+    return {
+        'ops': len(timings) / (total / 1e9),
+        'p50': timings[len(timings) // 2] / 1000,
+        'p99': timings[int(len(timings) * 0.99)] / 1000,
+    }
+
+
+def suite(sizes: list) -> dict:
+    results = {}
+    for size in sizes:
+        cases = build_table(size)
+        registry = RouteRegistry()
+        registry.compile()
+        print(f'{size} routes')
+        for name, samples in cases.items():
+            random.Random(size).shuffle(samples)
+            r = measure(registry, samples[:500], 0.5)
+            results[f'{size}:{name}'] = r
+            print(f"  {name:10s} {r['ops']:12.0f} ops/sec   p50 {r['p50']:8.2f} us   p99 {r['p99']:8.2f} us")
+    return results
+
+
+def compare(count: int):
+    RouteRegistry.reset()
+    router = Router('api')
+    for i in range(count // 4):
+        router.crud(f'resource{i}')
+    paths = [f'/api/resource{i}' for i in range(0, count // 4, max(1, count // 400))]
+    registry = RouteRegistry()
+    request = FakeRequest('GET')
+
+    # the old resolver compiled every pattern once at registration
+    compiled = [{**route, 'regex': build_path(route['path'])} for route in registry.all['_']['GET']]
+
+    def linear(path):
+        for route in compiled:
+            regex, params = route['regex']
+            match = regex.fullmatch(path)
+            if match:
+                return route, {k: v.convert(match.group(k)) for k, v in params.items()}
+        return None
+
+    def timeit(func, rounds):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for path in paths:
+                func(path)
+        return (time.perf_counter() - start) / (rounds * len(paths))
+
+    old = timeit(linear, 3)
+    new = timeit(lambda p: registry.resolve(request, {'path': p}), 300)
+
+    print(f'{count} routes registered, {len(paths)} static GET paths')
+    print(f'  linear scan  {old * 1e6:10.2f} us/op  {1 / old:12.0f} ops/sec')
+    print(f'  fast lane    {new * 1e6:10.2f} us/op  {1 / new:12.0f} ops/sec')
+    print(f'  speedup      {old / new:10.1f}x')
+
+
+def build_payload(size: int) -> dict:
+    """nested JSON-like body of roughly `size` bytes"""
+    rnd = random.Random(size)
+    records = []
+    length = 2
+    while length < size:
+        record = {
+            'id': len(records),
+            'title': f'record {len(records)} <b>bold</b>',
+            'status': rnd.choice(['draft', 'published', 'archived']),
+            'price': rnd.random() * 100,
+            'active': rnd.random() > 0.5,
+            'tags': [rnd.choice(['news', 'sport', 'tech', 'art']) for _ in range(4)],
+            'author': {'name': 'john', 'email': 'john@example.com', 'bio': 'it\'s "me" & co'},
+            'content': {'html': '<p>' + 'lorem ipsum ' * 10 + '</p>'},
+        }
+        records.append(record)
+        length += len(json.dumps(record)) + 1
+    return {'items': records}
+
+
+def sanitize(size: int):
+    from renus.core.injection import Injection
+
+    payload = build_payload(size)
+    cases = [
+        ('deepcopy + protect', lambda: Injection().protect(copy.deepcopy(payload))),
+        ('single pass', lambda: Injection().protect(payload)),
+        ('single pass, raw html', lambda: Injection().protect(payload, {'items.content'})),
+    ]
+    print(f"{len(json.dumps(payload)) / 1024 / 1024:.2f} MB body, {len(payload['items'])} records")
+    for name, func in cases:
+        tracemalloc.start()
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        rounds = 5
+        start = time.perf_counter()
+        for _ in range(rounds):
+            func()
+        elapsed = (time.perf_counter() - start) / rounds
+        print(f'  {name:22s} {elapsed * 1000:10.1f} ms   peak {peak / 1024 / 1024:8.2f} MB')
+
+
+def _option(args: list, name: str):
+    if name in args and args.index(name) + 1 < len(args):
+        return args[args.index(name) + 1]
+    return None
+
+
+def run(args=None):
+    args = args or []
+    sizes = [int(a) for a in args if a.isdigit()]
+
+    if '--compare' in args:
+        compare(sizes[0] if sizes else 5000)
+        return
+
+    if '--sanitize' in args:
+        sanitize(sizes[0] if sizes else 1024 * 1024)
+        return
+
+    if '--fuzz' in args:
+        from renus.commands.bench.fuzz import fuzz
+        cases = sizes[0] if sizes else 100000
+        failed = fuzz(cases, int(_option(args, '--seed') or 0))
+        for s, old, new in failed[:20]:
+            print(f'  mismatch {s!r}: {old!r} != {new!r}')
+        if failed:
+            print(f'{len(failed)} mismatches in {cases * 2} cases')
+            sys.exit(1)
+        print(f'escape matches the baseline on {cases * 2} cases')
+        return
+
+    results = suite(sizes or SIZES)
+
+    save = _option(args, '--save')
+    if save:
+        with open(save, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'saved to {save}')
+
+    baseline = _option(args, '--baseline')
+    if baseline:
+        with open(baseline) as f:
+            old = json.load(f)
+        failed = []
+        for key, r in results.items():
+            if key in old and r['ops'] < old[key]['ops'] * 0.9:
+                failed.append(f"  {key}: {old[key]['ops']:.0f} -> {r['ops']:.0f} ops/sec")
+        if failed:
+            print('regression against baseline:')
+            print('\n'.join(failed))
+            sys.exit(1)
+        print('no regression against baseline')
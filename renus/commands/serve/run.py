@@ -0,0 +1,238 @@
+import importlib
+import importlib.util
+import os
+import random
+import signal
+import socket
+import sys
+import time
+
+DESCRIPTION = """serve => Run index:app with uvicorn on 127.0.0.1:8000
+serve --workers 4 => Pre-fork 4 workers sharing one listening socket
+serve --host 0.0.0.0 --port 80 => Bind address
+serve --app module:attr => App to serve, default index:app
+serve --reuse-port => Each worker binds its own SO_REUSEPORT socket
+serve --max-requests 10000 => Recycle a worker after about this many requests
+serve --max-rss 512 => Recycle a worker whose RSS grows above this many MB"""
+
+CHECK_INTERVAL = 1
+# a worker dying sooner than this after its start is a crash loop, respawn slower
+MIN_UPTIME = 2
+
+
+def _option(args: list, name: str, default=None):
+    if name in args and args.index(name) + 1 < len(args):
+        return args[args.index(name) + 1]
+    return default
+
+
+def pick_loop() -> str:
+    return 'uvloop' if importlib.util.find_spec('uvloop') else 'asyncio'
+
+
+def pick_http() -> str:
+    return 'httptools' if importlib.util.find_spec('httptools') else 'h11'
+
+
+def load_app(target: str):
+    module, _, attr = target.partition(':')
+    return getattr(importlib.import_module(module), attr or 'app')
+
+
+def bind(host: str, port: int, reuse_port: bool = False) -> socket.socket:
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def rss_mb(pid: int):
+    """resident memory of pid in MB, None when it cannot be read"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if importlib.util.find_spec('psutil'):
+        import psutil
+        try:
+            return psutil.Process(pid).memory_info().rss / 1024 / 1024
+        except psutil.Error:
+            pass
+    return None
+
+
+class Server:
+    def __init__(self, app, host: str, port: int, workers: int = 1, reuse_port: bool = False,
+                 max_requests: int = 0, max_rss: float = 0) -> None:
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.reuse_port = reuse_port
+        self.max_requests = max_requests
+        self.max_rss = max_rss
+        self.sock = None
+        self.children = {}
+        self.recycling = set()
+        self.stopping = False
+
+    def config(self):
+        import uvicorn
+        # jitter so workers started together are not recycled together
+        limit = self.max_requests + random.randint(0, self.max_requests // 10) if self.max_requests else None
+        return uvicorn.Config(self.app, loop=pick_loop(), http=pick_http(), lifespan='on',
+                              limit_max_requests=limit)
+
+    def serve_worker(self) -> None:
+        import uvicorn
+        if 'renus.core.model' in sys.modules:
+            sys.modules['renus.core.model'].ModelBase.reconnect()
+        sock = bind(self.host, self.port, True) if self.reuse_port else self.sock
+        uvicorn.Server(self.config()).run(sockets=[sock])
+
+    def spawn(self) -> None:
+        # a stop signal arriving between fork and registering the pid would
+        # miss the new worker, hold it until the worker is in self.children
+        mask = signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGINT, signal.SIGTERM})
+        try:
+            pid = os.fork()
+            if pid == 0:
+                self.enter_worker(mask)
+            self.children[pid] = time.monotonic()
+        finally:
+            signal.pthread_sigmask(signal.SIG_SETMASK, mask)
+        print(f'worker {pid} started')
+
+    def enter_worker(self, mask) -> None:
+        """run in the forked child, never returns"""
+        code = 0
+        try:
+            # own process group: a terminal ^C reaches the master only, which
+            # then stops every worker once instead of forcing their exit
+            os.setpgid(0, 0)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.pthread_sigmask(signal.SIG_SETMASK, mask)
+            self.serve_worker()
+        except BaseException:
+            import traceback
+            traceback.print_exc()
+            code = 1
+        finally:
+            os._exit(code)
+
+    def run(self) -> None:
+        print(f'serving on http://{self.host}:{self.port} with {self.workers} workers '
+              f'({pick_loop()}, {pick_http()})')
+        if self.workers <= 1 and not self.max_requests and not self.max_rss:
+            import uvicorn
+            uvicorn.Server(self.config()).run(sockets=[bind(self.host, self.port)])
+            return
+
+        if not hasattr(os, 'fork'):
+            raise RuntimeError('--workers, --max-requests and --max-rss need os.fork')
+
+        if self.reuse_port:
+            if not hasattr(socket, 'SO_REUSEPORT'):
+                raise RuntimeError('SO_REUSEPORT is not supported on this platform')
+            # fail early on a taken port, the workers bind their own sockets
+            bind(self.host, self.port, True).close()
+        else:
+            self.sock = bind(self.host, self.port)
+
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        for _ in range(self.workers):
+            self.spawn()
+
+        while self.children:
+            self.reap()
+            if not self.stopping:
+                self.recycle()
+                while len(self.children) < self.workers:
+                    self.spawn()
+            time.sleep(CHECK_INTERVAL)
+        print('all workers stopped')
+
+    def reap(self) -> None:
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.children.clear()
+                return
+            if pid == 0:
+                return
+            started = self.children.pop(pid, None)
+            if started is None:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            if pid in self.recycling:
+                self.recycling.discard(pid)
+            elif self.stopping:
+                pass
+            elif code == 0 and self.max_requests:
+                # uvicorn exits cleanly once limit_max_requests is reached
+                print(f'worker {pid} served its max requests, recycling')
+            else:
+                print(f'worker {pid} exited with {code}, restarting')
+                if time.monotonic() - started < MIN_UPTIME:
+                    time.sleep(MIN_UPTIME)
+
+    def recycle(self) -> None:
+        if not self.max_rss:
+            return
+        for pid in list(self.children):
+            if pid in self.recycling:
+                continue
+            rss = rss_mb(pid)
+            if rss is not None and rss > self.max_rss:
+                print(f'worker {pid} uses {rss:.0f} MB, recycling')
+                # start the replacement first, the old worker drains for up
+                # to shutdown_grace and its capacity is kept meanwhile
+                self.spawn()
+                self.recycling.add(pid)
+                self.kill(pid, signal.SIGTERM)
+
+    def kill(self, pid: int, sig) -> None:
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def stop(self, signum, frame) -> None:
+        if self.stopping:
+            # second signal, do not wait for the drain
+            for pid in list(self.children):
+                self.kill(pid, signal.SIGKILL)
+            return
+        self.stopping = True
+        print('stopping workers')
+        for pid in list(self.children):
+            self.kill(pid, signal.SIGTERM)
+
+
+def run(args=None):
+    args = args or []
+    if importlib.util.find_spec('uvicorn') is None:
+        print('serve needs uvicorn: pip install uvicorn (uvloop and httptools are used when installed)')
+        return
+
+    server = Server(
+        load_app(_option(args, '--app', 'index:app')),
+        _option(args, '--host', '127.0.0.1'),
+        int(_option(args, '--port', 8000)),
+        int(_option(args, '--workers', 1)),
+        '--reuse-port' in args,
+        int(_option(args, '--max-requests', 0)),
+        float(_option(args, '--max-rss', 0)),
+    )
+    server.run()
@@ -0,0 +1,72 @@
+from collections import deque
+
+import anyio
+
+
+class Admission:
+    """
+    Concurrency limit with a short bounded wait queue. Requests over the
+    limit wait up to `wait` seconds for a free slot, and when the queue
+    is full or the wait runs out they are shed instead of piling up.
+    """
+
+    def __init__(self, limit: int, queue: int = None, wait: float = 0.5) -> None:
+        """
+        :param limit: requests running at the same time
+        :param queue: requests allowed to wait for a slot, default `limit`
+        :param wait: max seconds a request waits in the queue
+        """
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+        self.limit = limit
+        self.queue = limit if queue is None else queue
+        self.wait = wait
+        self.active = 0
+        self.admitted = 0
+        self.shed = 0
+        self._waiters = deque()
+
+    async def acquire(self) -> bool:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return True
+
+        if len(self._waiters) >= self.queue or self.wait <= 0:
+            self.shed += 1
+            return False
+
+        event = anyio.Event()
+        self._waiters.append(event)
+        try:
+            with anyio.move_on_after(self.wait):
+                await event.wait()
+        except BaseException:
+            if event.is_set():
+                self.release()
+            else:
+                self._waiters.remove(event)
+            raise
+
+        if not event.is_set():
+            self._waiters.remove(event)
+            self.shed += 1
+            return False
+        # release() handed its slot over to us
+        self.admitted += 1
+        return True
+
+    def release(self):
+        if self._waiters:
+            self._waiters.popleft().set()
+        else:
+            self.active -= 1
+
+    def stats(self) -> dict:
+        return {
+            'limit': self.limit,
+            'active': self.active,
+            'queued': len(self._waiters),
+            'admitted': self.admitted,
+            'shed': self.shed,
+        }
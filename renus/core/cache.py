@@ -1,8 +1,12 @@
 import os
 import pickle
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta,timezone
 from hashlib import sha3_256
 
+from renus.core.concurrency import run_in_threadpool_on
 from renus.core.config import Config
 from renus.core.log import Log
 from renus.util.helper import encode64
@@ -13,6 +17,107 @@ try:
 except ImportError:
     rds=None
 
+try:
+    import redis.asyncio
+except ImportError:
+    async_redis = None
+else:
+    def async_redis():
+        # a full pool makes callers wait up to redis_pool_timeout seconds
+        # for a connection instead of failing with "Too many connections"
+        return redis.asyncio.Redis(connection_pool=redis.asyncio.BlockingConnectionPool(
+            max_connections=Config('app').get('redis_max_connections', 64),
+            timeout=Config('app').get('redis_pool_timeout', 5),
+        ))
+
+# file entries: magic, expiry as 8 byte big endian unix time, pickled value.
+# Files without the magic are the older two pickles (expiry, value).
+HEADER_MAGIC = b'RNC1'
+HEADER_SIZE = len(HEADER_MAGIC) + 8
+# cache I/O threads come from the default pool, not the route's limiter,
+# so hits on a route do not queue behind its own slow handlers
+CACHE_LIMITER = 'default'
+# seconds of expiry covered by one file of the sweep index
+EXPIRY_BUCKET = 600
+
+
+def _read_expire(input) -> int:
+    """expiry of an open cache file, left positioned at the value"""
+    head = input.read(HEADER_SIZE)
+    if head[:len(HEADER_MAGIC)] == HEADER_MAGIC:
+        return int.from_bytes(head[len(HEADER_MAGIC):], 'big')
+    input.seek(0)
+    expire = pickle.load(input)
+    if isinstance(expire, datetime):
+        return int(expire.timestamp())
+    return int(expire)
+
+
+class MemoryTier:
+    """
+    In-process LRU in front of the cache driver, one per worker. Values
+    are kept pickled so callers get their own copy as from the driver,
+    and the byte budget counts the pickles. Entries live until their own
+    expiry or `max_ttl` seconds, whichever is first: writes and deletes
+    of other workers are only seen once the local entry runs out.
+    """
+
+    def __init__(self, max_bytes: int, max_ttl: float = 10) -> None:
+        self.max_bytes = max_bytes
+        self.max_ttl = max_ttl
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                if item[0] > time.monotonic():
+                    self._items.move_to_end(key)
+                    self.hits += 1
+                    return item[1]
+                self._drop(key)
+            self.misses += 1
+            return None
+
+    def put(self, key, payload: bytes, expire: float) -> None:
+        with self._lock:
+            if key in self._items:
+                self._drop(key)
+            # one big value must not flush the whole tier
+            if expire <= 0 or len(payload) > self.max_bytes // 4:
+                return
+            self._items[key] = (time.monotonic() + min(expire, self.max_ttl), payload)
+            self.bytes += len(payload)
+            while self.bytes > self.max_bytes:
+                self._drop(next(iter(self._items)))
+
+    def delete(self, key) -> None:
+        with self._lock:
+            if key in self._items:
+                self._drop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self.bytes = 0
+
+    def _drop(self, key) -> None:
+        self.bytes -= len(self._items.pop(key)[1])
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'items': len(self._items),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+        }
+
+
 class Cache:
     depth = 1
     folder_path = 'cache'
@@ -20,8 +125,20 @@ class Cache:
     if typ=='redis':
         assert rds is not None, "'redis' must be installed for Cache"
         rd=rds
+        # pooled asyncio client for the a* methods, older redis packages
+        # without redis.asyncio fall back to a thread
+        ard = async_redis() if async_redis is not None else None
     else:
         rd=None
+        ard=None
+    # optional L1, cache_memory_bytes=0 turns it off
+    memory = MemoryTier(
+        Config('app').get('cache_memory_bytes', 0),
+        Config('app').get('cache_memory_ttl', 10),
+    ) if Config('app').get('cache_memory_bytes', 0) else None
+    hits = 0
+    misses = 0
+
     def __init__(self, prefix: str = '', use_hash=False) -> None:
         self._prefix = prefix
         self._use_hash = use_hash
@@ -33,20 +150,99 @@ class Cache:
         :param value: value that save by key
         :param expire: seconds to expire from now
         """
+        v = self._remember(key, value, expire)
         if self.rd:
-            v=pickle.dumps(value,pickle.HIGHEST_PROTOCOL)
             self.rd.set(self._prefix+key,v,expire)
             return
+        self._put_file(key, v, expire)
+
+    async def aput(self, key: str, value, expire: int = 60):
+        """put without blocking the event loop"""
+        if self.ard is None:
+            return await run_in_threadpool_on(CACHE_LIMITER, self.put, key, value, expire)
+        v = self._remember(key, value, expire)
+        await self.ard.set(self._prefix+key, v, expire)
+
+    def _remember(self, key: str, value, expire) -> bytes:
+        v = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if self.memory is not None:
+            self.memory.put(self._memory_key(key), v, expire)
+        return v
+
+    def _put_file(self, key: str, v: bytes, expire):
         expire =  int((datetime.now(timezone.utc) + timedelta(seconds=expire)).timestamp())
         path = self._build_name(key, self.depth)
-        self._create_if_not_exist(path, value, expire)
+        self._create_if_not_exist(path, v, expire)
 
     def get(self, key: str, default=None):
+        if self.memory is not None:
+            v = self.memory.get(self._memory_key(key))
+            if v is not None:
+                return pickle.loads(v)
+
+        if self.rd:
+            if self.memory is None:
+                return self._from_redis(key, self.rd.get(self._prefix+key), 0, default)
+            pipe = self.rd.pipeline(transaction=False)
+            return self._from_redis(key, *pipe.get(self._prefix+key).pttl(self._prefix+key).execute(), default)
+
+        return self._get_file(key, default)
+
+    async def aget(self, key: str, default=None):
+        """get without blocking the event loop, memory hits are served in place"""
+        if self.memory is not None:
+            v = self.memory.get(self._memory_key(key))
+            if v is not None:
+                return pickle.loads(v)
+
+        if self.ard is not None:
+            if self.memory is None:
+                return self._from_redis(key, await self.ard.get(self._prefix+key), 0, default)
+            pipe = self.ard.pipeline(transaction=False)
+            return self._from_redis(key, *await pipe.get(self._prefix+key).pttl(self._prefix+key).execute(), default)
+
         if self.rd:
-            r=self.rd.get(self._prefix+key)
-            return default if r is None else pickle.loads(r)
+            return await run_in_threadpool_on(CACHE_LIMITER, self.get, key, default)
+        return await run_in_threadpool_on(CACHE_LIMITER, self._get_file, key, default)
+
+    def _from_redis(self, key: str, r, ttl: int, default):
+        self._count(r is not None)
+        if r is None:
+            return default
+        if self.memory is not None:
+            self.memory.put(self._memory_key(key), r, (ttl / 1000) if ttl > 0 else self.memory.max_ttl)
+        return pickle.loads(r)
+
+    def _get_file(self, key: str, default=None):
         path = self._build_name(key, self.depth)
-        return self._read_key(path, default)['value']
+        r = self._read_key(path, default)
+        self._count(r['expire'] != -1)
+        if self.memory is not None and r['expire'] != -1:
+            self.memory.put(
+                self._memory_key(key), pickle.dumps(r['value'], pickle.HIGHEST_PROTOCOL),
+                r['expire'].timestamp() - time.time()
+            )
+        return r['value']
+
+    @classmethod
+    def _count(cls, hit: bool):
+        if hit:
+            cls.hits += 1
+        else:
+            cls.misses += 1
+
+    @classmethod
+    def stats(cls) -> dict:
+        """hits and misses of the memory tier and of the driver in this worker"""
+        return {
+            'memory': cls.memory.stats() if cls.memory is not None else None,
+            cls.typ: {'hits': cls.hits, 'misses': cls.misses},
+        }
+
+    def _memory_key(self, key):
+        if self.rd:
+            return self._prefix + key
+        return self._prefix, self._use_hash, key
 
     def expire(self, key, default=None):
         if self.rd:
@@ -57,27 +253,105 @@ class Cache:
             return -1
         return max(-1,int(t.timestamp()- datetime.now(timezone.utc).timestamp()))
 
+    async def aexpire(self, key, default=None):
+        if self.ard is not None:
+            return max(-1, await self.ard.ttl(self._prefix+key))
+        return await run_in_threadpool_on(CACHE_LIMITER, self.expire, key, default)
+
     def delete(self, key):
+        if self.memory is not None:
+            self.memory.delete(self._memory_key(key))
         if self.rd:
             return self.rd.delete(self._prefix+key)
 
         path = self._build_name(key, self.depth)
         return self._delete_file(f"storage/{self.folder_path}{path}")
 
+    async def adelete(self, key):
+        if self.ard is None:
+            return await run_in_threadpool_on(CACHE_LIMITER, self.delete, key)
+        if self.memory is not None:
+            self.memory.delete(self._memory_key(key))
+        return await self.ard.delete(self._prefix+key)
+
     def delete_expired(self):
-        filename = f'./storage/{self.folder_path}/'
+        """
+        Delete expired file entries. Only the index buckets already due
+        are read, and each listed file is checked by its header, so a
+        sweep touches the entries that expired and nothing else. The
+        first sweep walks the whole tree once for files written before
+        the index existed.
+        """
+        index = f'storage/{self.folder_path}.index'
+        now = time.time()
         n = 0
-        for dirname, subdirs, files in os.walk(filename):
-            for file in files:
-                p=f'{dirname}/{file}'.replace(filename,'')
-                r=self._read_key(p)
-                if r['expire']==-1:
-                    t = self._delete_file(f"storage/{self.folder_path}/" + p)
-                    if t:
-                        n+=1
+        if not os.path.exists(f'{index}/.full'):
+            n += self._sweep_tree(now)
+            os.makedirs(index, exist_ok=True)
+            open(f'{index}/.full', 'w').close()
+
+        for name in os.listdir(index):
+            if not name.isdigit() or int(name) + EXPIRY_BUCKET > now:
+                continue
+            bucket = f'{index}/{name}'
+            try:
+                with open(bucket) as f:
+                    paths = set(line.strip() for line in f)
+            except FileNotFoundError:
+                # swept by another worker
+                continue
+            for path in paths:
+                if path and self._sweep_file(f'storage/{self.folder_path}{path}', now):
+                    n += 1
+            try:
+                os.remove(bucket)
+            except FileNotFoundError:
+                continue
 
         Log().info(f'delete_expired success: {n} files')
 
+    def _sweep_tree(self, now) -> int:
+        n = 0
+        for dirname, subdirs, files in os.walk(f'storage/{self.folder_path}'):
+            for file in files:
+                filename = os.path.join(dirname, file)
+                if file.endswith('.tmp'):
+                    # left by a writer that died before os.replace
+                    try:
+                        if os.path.getmtime(filename) < now - 3600:
+                            os.remove(filename)
+                    except OSError:
+                        pass
+                elif self._sweep_file(filename, now):
+                    n += 1
+        return n
+
+    def _sweep_file(self, filename, now) -> bool:
+        """delete filename when its expiry passed, the value is not loaded"""
+        try:
+            with open(filename, 'rb') as input:
+                expire = _read_expire(input)
+        except FileNotFoundError:
+            return False
+        except Exception:
+            expire = 0
+        if expire >= now:
+            return False
+        self._delete_file(filename)
+        return True
+
+    def _index(self, path, expire):
+        """add path to the bucket of its expiry for delete_expired"""
+        index = f'storage/{self.folder_path}.index'
+        bucket = expire - expire % EXPIRY_BUCKET
+        try:
+            with open(f'{index}/{bucket}', 'a') as f:
+                f.write(path + '\n')
+        except FileNotFoundError:
+            os.makedirs(index, exist_ok=True)
+            with open(f'{index}/{bucket}', 'a') as f:
+                f.write(path + '\n')
+
     def _delete_file(self, path, n=0):
         path = path.strip(' \n')
         try:
@@ -102,34 +376,43 @@ class Cache:
 
     def _create_if_not_exist(self, path, value, expire, n=0):
         filename = f'storage/{self.folder_path}{path}'
+        # readers see the old or the new file, never a half written one
+        tmp = f'{filename}.{os.getpid()}.{threading.get_ident()}.tmp'
         try:
             os.makedirs(os.path.dirname(filename), exist_ok=True)
-            with open(filename, 'wb') as output:
-                pickle.dump(expire, output, pickle.HIGHEST_PROTOCOL)
-                pickle.dump(value, output, pickle.HIGHEST_PROTOCOL)
-        except:
+            with open(tmp, 'wb') as output:
+                output.write(HEADER_MAGIC + expire.to_bytes(8, 'big'))
+                # value comes pickled from put
+                output.write(value)
+            os.replace(tmp, filename)
+        except Exception:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
             if n < 3:
                 self._create_if_not_exist(path, value, expire, n + 1)
+            return
+        self._index(path, expire)
 
     def _read_key(self, path, default=None, n=0):
         filename = f'storage/{self.folder_path}{path}'
-        if not os.path.exists(filename):
-            return {'value': default, 'expire': -1}
-
         try:
             with open(filename, 'rb') as input:
-                expire = pickle.load(input)
+                expire = _read_expire(input)
+                # expired entries are dropped without loading the value
+                if expire < time.time():
+                    self._delete_file(filename)
+                    return {'value': default, 'expire': -1}
                 value = pickle.load(input)
+        except FileNotFoundError:
+            return {'value': default, 'expire': -1}
         except Exception:
             if n < 3:
                 return self._read_key(path, default, n + 1)
             else:
                 return {'value': default, 'expire': -1}
-
-        if expire.timestamp() < datetime.now(timezone.utc).timestamp():
-            self._delete_file(filename)
-            return {'value': default, 'expire': -1}
-        return {'value': value, 'expire': expire}
+        return {'value': value, 'expire': datetime.fromtimestamp(expire, timezone.utc)}
 
     def _build_name(self, key: str, depth):
         h_key = hash_key(key, self._use_hash)
@@ -1,19 +1,235 @@
+import asyncio
+import contextvars
 import functools
+import math
+import multiprocessing
+import os
+import pickle
+import threading
 import typing
+from concurrent.futures import ProcessPoolExecutor
 from typing import Any, AsyncGenerator, Iterator
 
 import anyio
+from anyio.lowlevel import RunVar
 
 T = typing.TypeVar("T")
 
+# name of the thread limiter used by run_in_threadpool in this context,
+# App sets it per request from the route
+current_limiter: contextvars.ContextVar[typing.Optional[str]] = contextvars.ContextVar(
+    "current_limiter", default=None
+)
+
+_limiters: typing.Dict[str, anyio.CapacityLimiter] = {}
+_calls: typing.Dict[str, int] = {}
+
+
+def get_limiter(name: typing.Optional[str]) -> typing.Optional[anyio.CapacityLimiter]:
+    """
+    named CapacityLimiter sized from Config('app').thread_limiters, e.g.
+    {'default': 40, 'reports': 4}. None or 'default' is anyio's own limiter.
+    """
+    if name is None or name == "default":
+        # one per event loop, not cached: a new loop (tests, restarts)
+        # starts with anyio's stock size and is resized here
+        limiter = anyio.to_thread.current_default_thread_limiter()
+        size = _limiter_sizes().get("default")
+        if size and limiter.total_tokens != size:
+            limiter.total_tokens = size
+        return limiter
+
+    if name not in _limiters:
+        sizes = _limiter_sizes()
+        if name not in sizes:
+            raise RuntimeError(f"thread limiter '{name}' is not configured in thread_limiters")
+        _limiters[name] = anyio.CapacityLimiter(sizes[name])
+    return _limiters[name]
+
+
+def _limiter_sizes() -> dict:
+    from renus.core.config import Config
+    return Config("app").get("thread_limiters", {})
+
+
+def limiter_stats() -> dict:
+    """the default limiter is the one of the running event loop"""
+    limiters = dict(_limiters)
+    try:
+        limiters["default"] = get_limiter("default")
+    except RuntimeError:
+        # no event loop running
+        pass
+    res = {}
+    for name, limiter in limiters.items():
+        res[name] = {
+            "total": limiter.total_tokens,
+            "borrowed": limiter.borrowed_tokens,
+            "waiting": limiter.statistics().tasks_waiting,
+            "calls": _calls.get(name, 0),
+        }
+    return res
+
+
+def _resolve(limiter) -> typing.Optional[anyio.CapacityLimiter]:
+    name = limiter if limiter is not None else current_limiter.get()
+    if isinstance(name, anyio.CapacityLimiter):
+        return name
+    name = name or "default"
+    _calls[name] = _calls.get(name, 0) + 1
+    return get_limiter(name)
+
 
 async def run_in_threadpool(
         func: typing.Callable[..., T], *args: typing.Any, **kwargs: typing.Any
 ) -> T:
+    """runs on the limiter of the current route, see current_limiter"""
+    return await run_in_threadpool_on(None, func, *args, **kwargs)
+
+
+async def run_in_threadpool_on(
+        limiter, func: typing.Callable[..., T], /, *args: typing.Any, **kwargs: typing.Any
+) -> T:
+    """
+    :param limiter: limiter name or CapacityLimiter, None for the one of
+    the current route. Kept out of kwargs, those all go to func.
+    """
     if kwargs:  # pragma: no cover
         # run_sync doesn't accept 'kwargs', so bind them in here
         func = functools.partial(func, **kwargs)
-    return await anyio.to_thread.run_sync(func, *args)
+    return await anyio.to_thread.run_sync(func, *args, limiter=_resolve(limiter))
+
+
+async def run_in_threadpool_abandon(
+        func: typing.Callable[..., T], *args: typing.Any, **kwargs: typing.Any
+) -> T:
+    """
+    Like run_in_threadpool, but when the caller is cancelled it stops
+    waiting at once. The thread itself cannot be stopped and runs to the
+    end, and keeps its limiter token until then: abandoned threads still
+    count, so a slow dependency cannot grow the thread count past the limit.
+    """
+    if kwargs:
+        func = functools.partial(func, **kwargs)
+    limiter = _resolve(None)
+    borrower = object()
+    await limiter.acquire_on_behalf_of(borrower)
+    lock = threading.Lock()
+    state = {"started": False, "released": False}
+
+    def release_once() -> bool:
+        with lock:
+            if state["released"]:
+                return False
+            state["released"] = True
+            return True
+
+    def work():
+        with lock:
+            if state["released"]:
+                # the caller gave up before the thread started
+                return None
+            state["started"] = True
+        try:
+            return func(*args)
+        finally:
+            if release_once():
+                try:
+                    anyio.from_thread.run_sync(limiter.release_on_behalf_of, borrower)
+                except RuntimeError:
+                    # the event loop is gone
+                    pass
+
+    try:
+        return await anyio.to_thread.run_sync(work, abandon_on_cancel=True, limiter=_unbounded())
+    except BaseException:
+        with lock:
+            started = state["started"]
+        if not started and release_once():
+            limiter.release_on_behalf_of(borrower)
+        raise
+
+
+_unbounded_limiter: RunVar[anyio.CapacityLimiter] = RunVar("_unbounded_limiter")
+
+
+def _unbounded() -> anyio.CapacityLimiter:
+    """for threads that already hold a token of their real limiter"""
+    try:
+        return _unbounded_limiter.get()
+    except LookupError:
+        limiter = anyio.CapacityLimiter(math.inf)
+        _unbounded_limiter.set(limiter)
+        return limiter
+
+
+_process_pool: typing.Optional[ProcessPoolExecutor] = None
+# bounds the waiting threads on event loops other than asyncio
+_process_limiter: typing.Optional[anyio.CapacityLimiter] = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """ProcessPoolExecutor sized by Config('app').process_workers, default one per core"""
+    global _process_pool, _process_limiter
+    if _process_pool is None:
+        from renus.core.config import Config
+        workers = Config("app").get("process_workers", None) or os.cpu_count() or 1
+        # never fork the server, its threads may hold locks the child would inherit
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _process_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+        _process_limiter = anyio.CapacityLimiter(workers)
+    return _process_pool
+
+
+async def _wait_process(future):
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        # not asyncio: wait in threads, at most one per process of the pool
+        return await anyio.to_thread.run_sync(future.result, abandon_on_cancel=True, limiter=_process_limiter)
+    return await asyncio.wrap_future(future)
+
+
+def shutdown_process_pool() -> None:
+    global _process_pool, _process_limiter
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+    _process_limiter = None
+
+
+def _process_call(payload: bytes) -> bytes:
+    func, args, kwargs = pickle.loads(payload)
+    result = func(*args, **kwargs)
+    try:
+        return pickle.dumps(result)
+    except Exception as exc:
+        raise TypeError(f"result of {getattr(func, '__qualname__', func)!r} is not picklable: {exc}") from None
+
+
+async def run_in_process(
+        func: typing.Callable[..., T], *args: typing.Any, **kwargs: typing.Any
+) -> T:
+    """
+    Run func in the process pool, for CPU bound code holding the GIL.
+    func, its arguments and the result cross the process boundary pickled,
+    so func must be importable at module level. The result is awaited on
+    the event loop, queued jobs hold no thread.
+    """
+    try:
+        payload = pickle.dumps((func, args, kwargs))
+    except Exception as exc:
+        raise TypeError(
+            f"{getattr(func, '__qualname__', func)!r} runs in a process, its arguments must be picklable: {exc}"
+        ) from None
+
+    future = get_process_pool().submit(_process_call, payload)
+    try:
+        result = await _wait_process(future)
+    except BaseException:
+        future.cancel()
+        raise
+    return pickle.loads(result)
 
 
 class _StopIteration(Exception):
@@ -33,6 +249,6 @@ def _next(iterator: Iterator) -> Any:
 async def iterate_in_threadpool(iterator: Iterator) -> AsyncGenerator:
     while True:
         try:
-            yield await anyio.to_thread.run_sync(_next, iterator)
+            yield await run_in_threadpool(_next, iterator)
         except _StopIteration:
             break
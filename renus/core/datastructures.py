@@ -7,6 +7,9 @@ from renus.core.config import Config
 
 
 class Background:
+    # tasks currently running in this worker, App waits for them on shutdown
+    running = 0
+
     def __init__(
         self, func: typing.Callable, *args: typing.Any, **kwargs: typing.Any
     ) -> None:
@@ -16,10 +19,14 @@ class Background:
         self.is_async = asyncio.iscoroutinefunction(func)
 
     async def __call__(self) -> None:
-        if self.is_async:
-            await self.func(*self.args, **self.kwargs)
-        else:
-            await run_in_threadpool(self.func, *self.args, **self.kwargs)
+        Background.running += 1
+        try:
+            if self.is_async:
+                await self.func(*self.args, **self.kwargs)
+            else:
+                await run_in_threadpool(self.func, *self.args, **self.kwargs)
+        finally:
+            Background.running -= 1
 
 class MultiDict(typing.Mapping):
     def __init__(
@@ -1,39 +1,124 @@
+import threading
+from collections import OrderedDict
 from html import unescape
 from html.parser import HTMLParser
 
+from renus.core.config import Config
+
+
+_SPECIAL_CHARS = str.maketrans({
+    "<": "&lt;",
+    ">": "&gt;",
+    '"': "&quot;",
+    "'": "&#039;",
+})
+
 
 class Injection:
+    # LRU of parser results shared by all instances, keyed by the raw string
+    cache_size = Config('app').get('xss_cache_size', 0)
+    cache_max_length = Config('app').get('xss_cache_max_length', 256)
+    _cache = OrderedDict()
+    _cache_lock = threading.Lock()
+    _cache_hits = 0
+    _cache_misses = 0
+
+    @classmethod
+    def memoize(cls, size: int, max_length: int = None):
+        """
+        :param size: max cached strings, 0 disables the cache
+        :param max_length: longer strings are never cached
+        """
+        with cls._cache_lock:
+            cls.cache_size = size
+            if max_length is not None:
+                cls.cache_max_length = max_length
+            cls._cache.clear()
+            Injection._cache_hits = 0
+            Injection._cache_misses = 0
+
+    @classmethod
+    def cache_stats(cls) -> dict:
+        total = cls._cache_hits + cls._cache_misses
+        return {
+            'size': len(cls._cache),
+            'max_size': cls.cache_size,
+            'hits': cls._cache_hits,
+            'misses': cls._cache_misses,
+            'hit_rate': cls._cache_hits / total if total else 0.0,
+        }
+
     def escape(self, value:str):
+        if '<' not in value and '&' not in value:
+            # no tag and no entity: the parser would only see one data chunk
+            return value.translate(_SPECIAL_CHARS).strip()
+
+        if not self.cache_size or len(value) > self.cache_max_length:
+            return self._parse(value)
+
+        cache = self._cache
+        res = cache.get(value)
+        if res is not None:
+            try:
+                cache.move_to_end(value)
+            except KeyError:
+                pass
+            Injection._cache_hits += 1
+            return res
+
+        Injection._cache_misses += 1
+        res = self._parse(value)
+        with self._cache_lock:
+            cache[value] = res
+            while len(cache) > self.cache_size:
+                cache.popitem(last=False)
+        return res
+
+    @staticmethod
+    def _parse(value: str):
         parser = Xss()
         parser.feed(unescape(value))
         parser.close()
         return parser.getEscaped().strip()
 
-    def protect(self, data):
-        return self.__value_handle(data)
+    def protect(self, data, skip=None):
+        """
+        build a sanitised copy of data in a single walk, the input is not
+        modified so there is no need to copy it first
+        :param skip: dotted keys ("content", "items.body") whose values are
+        returned as is, list items share the key of their list
+        """
+        return self.__value_handle(data, skip or None, '')
 
-    def __list_handle(self, data):
+    def __list_handle(self, data, skip, path):
         res = []
         for item in data:
-            res.append(self.__value_handle(item))
+            res.append(self.__value_handle(item, skip, path))
         return res
 
-    def __value_handle(self, value):
+    def __value_handle(self, value, skip=None, path=''):
         typ = type(value)
         if value is None or typ in [bool, int, float]:
             v = value
         elif typ is dict:
-            v = self.__dict_handle(value)
+            v = self.__dict_handle(value, skip, path)
         elif typ is list:
-            v = self.__list_handle(value)
+            v = self.__list_handle(value, skip, path)
         else:
             v = self.escape(str(value))
         return v
 
-    def __dict_handle(self, obj: dict):
+    def __dict_handle(self, obj: dict, skip, path):
         res = {}
         for key, value in obj.items():
-            res[self.escape(str(key))] = self.__value_handle(value)
+            if skip is None:
+                res[self.escape(str(key))] = self.__value_handle(value)
+                continue
+            name = f'{path}.{key}' if path else str(key)
+            if name in skip:
+                res[self.escape(str(key))] = value
+            else:
+                res[self.escape(str(key))] = self.__value_handle(value, skip, name)
         return res
 
 
@@ -127,7 +212,4 @@ class Xss(HTMLParser):
                 return 'http:%s' % str(attr[1])
         return attr[1]
     def _htmlspecialchars(self, html):
-        return html.replace("<", "&lt;") \
-            .replace(">", "&gt;") \
-            .replace('"', "&quot;") \
-            .replace("'", "&#039;")
+        return html.translate(_SPECIAL_CHARS)
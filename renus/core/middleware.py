@@ -1,12 +1,66 @@
+import inspect
+
+from renus.core.concurrency import run_in_threadpool
+
+SYNC = 0
+ASYNC = 1
+THREAD = 2
+
+
+def threaded(middleware):
+    """mark a blocking sync middleware to always run in the threadpool"""
+    middleware.threadpool = True
+    return middleware
+
+
+def compose(middlewares, threadpool: bool = False) -> tuple:
+    """
+    work out once how every middleware of a chain must be called
+    :param threadpool: run every sync middleware in the threadpool
+    """
+    chain = []
+    for middleware in middlewares:
+        if inspect.iscoroutinefunction(middleware) or (
+                not inspect.isclass(middleware)
+                and inspect.iscoroutinefunction(getattr(middleware, '__call__', None))):
+            mode = ASYNC
+        elif threadpool or getattr(middleware, 'threadpool', False):
+            mode = THREAD
+        else:
+            mode = SYNC
+        chain.append((middleware, mode))
+    return tuple(chain)
+
+
 class Middleware:
-    def __init__(self, request, middlewares=None) -> None:
+    def __init__(self, request, middlewares=None, chain=None) -> None:
         self.middlewares = [] if middlewares is None else middlewares
+        self.chain = compose(self.middlewares) if chain is None else chain
         self.request = request
 
     def next(self):
-        for middleware in self.middlewares:
+        """run the chain, every middleware must be sync"""
+        for middleware, mode in self.chain:
+            if mode == ASYNC:
+                raise TypeError(f'{middleware!r} is async, use `await Middleware.run()`')
             handle = middleware(self.request)
             if handle is True:
                 continue
             return handle
         return True
+
+    async def run(self):
+        """run the chain, awaiting async middlewares and threaded ones"""
+        for middleware, mode in self.chain:
+            if mode == ASYNC:
+                handle = await middleware(self.request)
+            elif mode == THREAD:
+                handle = await run_in_threadpool(middleware, self.request)
+            else:
+                handle = middleware(self.request)
+                if inspect.isawaitable(handle):
+                    handle = await handle
+            if handle is True:
+                continue
+            return handle
+        return True
@@ -58,11 +58,15 @@ class ReModel:
 M = TypeVar('T')
 
 
+def _connect() -> MongoClient:
+    return MongoClient(Config('database').get('host', '127.0.0.1'),
+                       Config('database').get('port', 27017),
+                       username=Config('database').get('username', None),
+                       password=Config('database').get('password', None))
+
+
 class ModelBase(Generic[M]):
-    client = MongoClient(Config('database').get('host', '127.0.0.1'),
-                         Config('database').get('port', 27017),
-                         username=Config('database').get('username', None),
-                         password=Config('database').get('password', None))
+    client = _connect()
 
     _database_name = Config('database').get('name', 'renus')
     collection_name = None
@@ -85,6 +89,14 @@ class ModelBase(Generic[M]):
         self._select = None
         self.visible_fields = []
 
+    @classmethod
+    def reconnect(cls) -> None:
+        """
+        new MongoClient for a forked worker, a client is not fork safe.
+        The parent's client is left untouched.
+        """
+        ModelBase.client = _connect()
+
     def __iter__(self):
         return iter(self.get())
 
@@ -1,6 +1,6 @@
-import copy
 import json
 import re
+import time
 import typing
 from urllib.parse import parse_qsl
 
@@ -16,6 +16,7 @@ MAX_HEADER_SIZE=Config('app').get('max_headers_size',8192)
 MAX_COOKIES=Config('app').get('max_cookies',50)
 MAX_COOKIE_SIZE=Config('app').get('max_cookies_size',4096)
 MAX_QUERY_SIZE=Config('app').get('max_query_size',1024)
+MAX_HOST_CACHE=Config('app').get('max_host_cache',1024)
 class Request:
     cryptor = None
 
@@ -24,14 +25,29 @@ class Request:
         self._receive = receive
         self._headers = headers_parser(self._scope.get('headers', []))
         self._stream_consumed = False
-        self.inputs = {}
+        self._inputs = {}
         self.route = {}
         self.state = {}
+        self.deadline = None
 
     @property
     def headers(self) -> dict:
         return self._headers
 
+    @property
+    def inputs(self):
+        if self._inputs is None:
+            # deferred by form_lazy, the body is already buffered
+            if not hasattr(self, "_form"):
+                self._form = self._parse_body(self._body)
+            self._form_safe = self._protect(self._form, self._raw_fields())
+            self._inputs = self._form_safe
+        return self._inputs
+
+    @inputs.setter
+    def inputs(self, value):
+        self._inputs = value
+
     @property
     def cookies(self):
         if not hasattr(self, "_cookies"):
@@ -55,24 +71,31 @@ class Request:
         if not hasattr(self, "_subdomain"):
             host = self.headers.get('host', None)
             if host is None:
-                return None
-
-            ip = re.findall(r'[0-9]+(?:\.[0-9]+){3}', host)
-            if len(ip) != 0:
-                return None
-            r = host.split('.')
-
-            if len(r) <= 1:
-                return None
-            if len(r) == 2:
-                if r[1].split(':')[0] == 'localhost':
-                    return r[0]
-                else:
-                    return None
-            self._subdomain = r[0]
+                self._subdomain = None
+            elif host in _host_cache:
+                self._subdomain = _host_cache[host]
+            else:
+                self._subdomain = subdomain_parser(host)
+                if len(_host_cache) >= MAX_HOST_CACHE:
+                    _host_cache.pop(next(iter(_host_cache)), None)
+                _host_cache[host] = self._subdomain
 
         return self._subdomain
 
+    @property
+    def remaining(self):
+        """seconds left before the route timeout, None without a timeout"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    @property
+    def remaining_ms(self):
+        """milliseconds left, e.g. for a mongo `max_time_ms`"""
+        if self.deadline is None:
+            return None
+        return int(self.remaining * 1000)
+
     @property
     def user_agent(self):
         return self.headers.get("user-agent", None)
@@ -132,6 +155,17 @@ class Request:
     def _get_real_content_type(self) -> str:
         return self.headers.get('real-type', 'application/json')
 
+    def _content_type(self) -> bytes:
+        content_type, options = parse_options_header(self.headers.get("content-type", ""))
+        return content_type
+
+    def _is_form_encoded(self) -> bool:
+        return not self._is_encrypted() and self._content_type() in [
+            b"multipart/form-data",
+            b"app/x-www-form-urlencoded",
+            b"application/x-www-form-urlencoded",
+        ]
+
     def _decrypt_body(self, body: bytes) -> typing.Any:
         try:
             decrypted_text = self.cryptor(request=self).decrypt_text(body.decode('utf-8').strip())
@@ -186,12 +220,10 @@ class Request:
 
     async def form(self):
         if not hasattr(self, "_form"):
-            content_type_header = self.headers.get("content-type", "")
-            content_type, options = parse_options_header(content_type_header)
+            content_type = self._content_type()
 
             if self._is_encrypted():
-                raw_body = await self.body()
-                self._form = self._decrypt_body(raw_body)
+                self._form = self._parse_body(await self.body())
             elif content_type == b"multipart/form-data":
                 multipart_parser = MultiPartParser(self.headers, self.stream())
                 self._form = await multipart_parser.parse()
@@ -199,22 +231,47 @@ class Request:
                 form_parser = FormParser(self.headers, self.stream())
                 self._form = dict(await form_parser.parse())
             else:
-                body = await self.body()
-                try:
-                    self._form = {} if body == b"" else json.loads(body)
-                except Exception:
-                    self._form = {}
+                self._form = self._parse_body(await self.body())
 
         return self._form
 
+    def _parse_body(self, body: bytes):
+        if self._is_encrypted():
+            return self._decrypt_body(body)
+        try:
+            return {} if body == b"" else json.loads(body)
+        except Exception:
+            return {}
+
+    def _raw_fields(self):
+        return (self.route or {}).get('raw_fields', None)
+
+    @staticmethod
+    def _protect(form, skip=None):
+        if isinstance(form, dict):
+            return Injection().protect(form, skip)
+        return form
+
     async def form_safe(self):
         if not hasattr(self, "_form_safe"):
-            self._form_safe = await self.form()
-            if isinstance(self._form_safe, dict):
-                self._form_safe = Injection().protect(copy.deepcopy(self._form_safe))
+            self._form_safe = self._protect(await self.form(), self._raw_fields())
             self.inputs = self._form_safe
         return self._form_safe
 
+    async def form_lazy(self):
+        """
+        buffer the body now, parse and sanitise it on the first read of
+        `inputs`. Form encoded bodies need the async parsers, so they are
+        handled like form_safe.
+        """
+        if hasattr(self, "_form_safe"):
+            return
+        if self._is_form_encoded():
+            await self.form_safe()
+        else:
+            await self.body()
+            self._inputs = None
+
 
 _VALID_HEADER_NAME_RE = re.compile(r'^[a-zA-Z0-9!#$%&\'*+\-.^_`|~]+$')
 
@@ -295,6 +352,34 @@ def cookie_parser(cookie_string: str) -> typing.Dict[str, str]:
     return cookie_dict
 
 
+_host_cache: typing.Dict[str, typing.Optional[str]] = {}
+
+
+def _is_digits(value: str) -> bool:
+    return value.isascii() and value.isdigit()
+
+
+def _has_ip(host: str) -> bool:
+    parts = host.split('.')
+    for i in range(len(parts) - 3):
+        if (parts[i][-1:].isascii() and parts[i][-1:].isdigit()
+                and _is_digits(parts[i + 1]) and _is_digits(parts[i + 2])
+                and parts[i + 3][:1].isascii() and parts[i + 3][:1].isdigit()):
+            return True
+    return False
+
+
+def subdomain_parser(host: str) -> typing.Optional[str]:
+    r = host.split('.')
+    if len(r) <= 1 or _has_ip(host):
+        return None
+    if len(r) == 2:
+        if r[1].split(':')[0] == 'localhost':
+            return r[0]
+        return None
+    return r[0]
+
+
 def query_parser(query_string: str):
     if len(query_string) > MAX_QUERY_SIZE:
         raise RuntimeError("Query too large")
@@ -1,3 +1,4 @@
+import copy
 import gzip
 import http.cookies
 import inspect
@@ -432,3 +433,106 @@ class PrivateResponse(Response):
         Cache().put(rnd, 'access to private')
         content = f'/storage/private/{rnd}/{content}'
         return content.encode(self.charset)
+
+
+class EncodedResponse(Response):
+    """
+    A Response frozen for the route cache: status, header bytes and the
+    identity body, plus a gzip body built once on first use. Replaying it
+    renders and compresses nothing. Encrypted responses keep their
+    cryptor and are still encrypted per request.
+    """
+    gzip_min = 500
+
+    def __init__(self, status_code, raw_headers: tuple, body: bytes, cryptor=None,
+                 plain_headers: tuple = ()) -> None:
+        self.status_code = status_code
+        self.raw_headers = raw_headers
+        self.body = body
+        self.gzip_body = None
+        self.cryptor = cryptor
+        # headers sent when encrypting fails, as Response.init_headers() builds them
+        self.plain_headers = plain_headers
+        self.extra_headers = ()
+        self.background = None
+
+    @classmethod
+    def encode(cls, response: Response, vary: typing.Sequence[str] = ()):
+        """
+        :param vary: request headers the cached body depends on
+        :return: None for responses that stream or read a file when sent
+        """
+        if isinstance(response, EncodedResponse):
+            return response
+        if type(response).__call__ is not Response.__call__:
+            return None
+
+        headers = tuple(
+            h for h in response.raw_headers if h[0] not in (b"content-encoding", b"content-length")
+        )
+        if vary:
+            headers += ((b"vary", ", ".join(vary).encode("utf-8")),)
+        if not response.encrypt:
+            return cls(response.status_code, headers, response.body)
+
+        plain = ()
+        if response.media_type is not None:
+            content_type = response.media_type
+            if content_type.startswith("text/"):
+                content_type += "; charset=" + response.charset
+            plain = ((b"content-type", content_type.encode("utf-8")),)
+        return cls(response.status_code, headers, response.body, response.cryptor, plain)
+
+    def compress(self) -> bool:
+        """build the gzip body, True when it was built by this call"""
+        if self.gzip_body is not None or self.cryptor is not None or len(self.body) <= self.gzip_min:
+            return False
+        self.gzip_body = gzip.compress(self.body)
+        return True
+
+    def replay(self, extra_headers: tuple = (), background: Background = None) -> "EncodedResponse":
+        """copy for one request, sharing the encoded bytes"""
+        r = copy.copy(self)
+        r.extra_headers = extra_headers
+        r.background = background
+        return r
+
+    def set_cookie(self, *args, **kwargs) -> None:
+        raise RuntimeError("an encoded response is immutable")
+
+    async def __call__(self, request, scope, receive, send) -> None:
+        accepts = "gzip" in request.headers.get("accept-encoding", "")
+        headers = self.raw_headers
+        body = self.body
+        if self.cryptor is not None:
+            try:
+                body = self.cryptor(request=request).encrypt(body)
+            except Exception:
+                headers = self.plain_headers
+            if accepts and len(body) > self.gzip_min:
+                body = gzip.compress(body)
+            else:
+                accepts = False
+        elif accepts and len(body) > self.gzip_min:
+            if self.gzip_body is None:
+                self.compress()
+            body = self.gzip_body
+        else:
+            accepts = False
+
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": [
+                    *headers,
+                    *self.extra_headers,
+                    (b"content-encoding", b"gzip" if accepts else b"none"),
+                    (b"content-length", str(len(body)).encode("utf-8")),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+        if self.background is not None:
+            await self.background()
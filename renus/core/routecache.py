@@ -0,0 +1,185 @@
+import time
+
+import anyio
+
+from renus.core.cache import Cache
+from renus.core.datastructures import Background
+from renus.core.log import Log
+from renus.core.response import EncodedResponse, Response, TextResponse
+
+
+class _Flight:
+    __slots__ = ("event", "error", "uncached")
+
+    def __init__(self) -> None:
+        self.event = anyio.Event()
+        self.error = None
+        # the response could not be cached, waiters run the handler themselves
+        self.uncached = False
+
+
+class RouteCache:
+    """
+    The `cache=` of a route. Concurrent misses of one key run the handler
+    once in this worker and the others wait for its result. An entry past
+    its ttl is served for `stale` more seconds while one request refreshes
+    it after its response is sent, and for `stale_if_error` seconds when
+    the handler fails or returns a 5xx.
+
+    Entries hold an EncodedResponse, responses that stream or send a file
+    are not cached. `vary` adds request headers ("accept-language") or
+    cookies ("cookie:role") to the key.
+    """
+
+    # key -> running handler, shared by every route of this worker
+    _flights = {}
+
+    def __init__(self, ttl: int, stale: int = 0, stale_if_error: int = 0, vary: list = None) -> None:
+        """
+        :param ttl: seconds an entry is fresh
+        :param stale: seconds an expired entry is served while refreshing
+        :param stale_if_error: seconds an expired entry is served when refreshing fails
+        :param vary: header names or "cookie:<name>" the response depends on
+        """
+        self.ttl = ttl
+        self.stale = stale
+        self.stale_if_error = stale_if_error
+        self.vary = tuple(v.lower() for v in vary or ())
+        self.vary_header = tuple(dict.fromkeys(v.split(":", 1)[0] for v in self.vary))
+        self.hits = 0
+        self.coalesced = 0
+        self.stale_serves = 0
+
+    def key(self, request) -> str:
+        key = request.full_path
+        for name in self.vary:
+            if name.startswith("cookie:"):
+                value = request.cookies.get(name[7:], "")
+            else:
+                value = request.headers.get(name, "")
+            key += f"\n{name}={value}"
+        return key
+
+    async def fetch(self, request, produce):
+        """
+        :param produce: coroutine function running the handler
+        :return: the cached or the new response
+        """
+        key = self.key(request)
+        while True:
+            entry = await Cache(use_hash=True).aget(key, None)
+            if not isinstance(entry, dict) or not isinstance(entry.get('response'), EncodedResponse):
+                # missing, or written by an older version
+                entry = None
+            now = time.time()
+            if entry is not None:
+                if now < entry['fresh']:
+                    self.hits += 1
+                    return await self._replay(key, entry, request, b'ok')
+                if now < entry['fresh'] + self.stale:
+                    background = None
+                    if key not in self._flights:
+                        background = Background(self.refresh, key, request, produce)
+                    return await self._replay(key, entry, request, b'stale', background)
+
+            flight = self._flights.get(key)
+            if flight is None:
+                break
+            self.coalesced += 1
+            await flight.event.wait()
+            error = flight.error
+            if error is not None:
+                if self._usable_on_error(entry, time.time()):
+                    return await self._replay(key, entry, request, b'stale')
+                if not isinstance(error, _ServerError):
+                    raise error
+                if error.encoded is not None:
+                    return error.encoded.replay()
+                return await produce()
+            if flight.uncached:
+                return await produce()
+            # stored, or the leader was cancelled: read the cache again, the
+            # first waiter to find no flight leads and the others wait on it
+
+        try:
+            return await self._lead(key, request, produce)
+        except _ServerError as exc:
+            if self._usable_on_error(entry, time.time()):
+                return await self._replay(key, entry, request, b'stale')
+            return exc.response
+        except Exception:
+            if self._usable_on_error(entry, time.time()):
+                return await self._replay(key, entry, request, b'stale')
+            raise
+
+    async def refresh(self, key: str, request, produce) -> None:
+        if key in self._flights:
+            return
+        try:
+            await self._lead(key, request, produce)
+        except Exception as exc:
+            Log().error(f'route cache refresh of {key} failed: {exc!r}')
+
+    async def _lead(self, key: str, request, produce):
+        flight = _Flight()
+        self._flights[key] = flight
+        try:
+            r = await produce()
+            if not isinstance(r, Response):
+                r = TextResponse(r)
+            encoded = EncodedResponse.encode(r, self.vary_header)
+            if r.status_code >= 500:
+                raise _ServerError(r, encoded)
+            if encoded is None:
+                flight.uncached = True
+                return r
+
+            if _accepts_gzip(request):
+                encoded.compress()
+            await self._store(key, {'fresh': time.time() + self.ttl, 'response': encoded})
+            return encoded.replay(background=r.background)
+        except Exception as exc:
+            flight.error = exc
+            raise
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.event.set()
+
+    async def _store(self, key: str, entry: dict) -> None:
+        remaining = entry['fresh'] + max(self.stale, self.stale_if_error) - time.time()
+        if remaining >= 1:
+            await Cache(use_hash=True).aput(key, entry, int(remaining))
+
+    def _usable_on_error(self, entry, now: float) -> bool:
+        return entry is not None and now < entry['fresh'] + self.stale_if_error
+
+    async def _replay(self, key: str, entry: dict, request, state: bytes, background=None):
+        if state == b'stale':
+            self.stale_serves += 1
+        encoded = entry['response']
+        # the gzip body is built on the first hit asking for it and kept
+        if _accepts_gzip(request) and encoded.compress():
+            await self._store(key, entry)
+        return encoded.replay(((b'r-cache', state),), background)
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'coalesced': self.coalesced,
+            'stale': self.stale_serves,
+        }
+
+
+def _accepts_gzip(request) -> bool:
+    return "gzip" in request.headers.get("accept-encoding", "")
+
+
+class _ServerError(Exception):
+    """a 5xx from the handler, not cached and a trigger for stale_if_error"""
+
+    def __init__(self, response, encoded) -> None:
+        super().__init__(f'status {response.status_code}')
+        self.response = response
+        # the leader sends its own response, waiters replay this one
+        self.encoded = encoded
@@ -1,7 +1,13 @@
+from bisect import bisect_left
+from collections import OrderedDict
 from collections.abc import Callable
+import functools
+import inspect
 import re
 import threading
 
+from renus.core.admission import Admission
+
 try:
     from bson import ObjectId
 except ImportError:
@@ -31,44 +37,126 @@ class RouteRegistry:
                 if cls._instance is None:
                     cls._instance = super().__new__(cls)
                     cls._instance._routes = {}
+                    cls._instance._trees = {}
                     cls._instance._subdomains_cache = None
+                    cls._instance._memo = OrderedDict()
+                    cls._instance._memo_size = 0
+                    cls._instance._memo_hits = 0
+                    cls._instance._memo_misses = 0
+                    cls._instance._frozen = False
+                    cls._instance._conflicts = []
         return cls._instance
 
     def register(self, subdomain: str, method: str, route_entry: dict):
         sub = subdomain or "_"
         with self._lock:
+            if self._frozen:
+                raise RuntimeError(
+                    f"RouteRegistry is compiled, cannot register {method} {route_entry['path']}"
+                )
             if sub not in self._routes:
                 self._routes[sub] = {}
             if method not in self._routes[sub]:
                 self._routes[sub][method] = []
+                self._trees.setdefault(sub, {})[method] = RouteTree()
             self._routes[sub][method].append(route_entry)
+            self._trees[sub][method].insert(route_entry)
             self._subdomains_cache = None
-        
+            self._memo.clear()
+
+    def memoize(self, size: int):
+        """
+        keep the last `size` resolved (subdomain, method, path) in memory
+        :param size: max entries, 0 disables the memo
+        """
+        with self._lock:
+            self._memo_size = max(0, int(size or 0))
+            self._memo.clear()
+            self._memo_hits = 0
+            self._memo_misses = 0
+
+    @property
+    def memo_stats(self) -> dict:
+        return {
+            "size": len(self._memo),
+            "max_size": self._memo_size,
+            "hits": self._memo_hits,
+            "misses": self._memo_misses,
+        }
+
     def resolve(self, request, scope) -> dict|None:
         method = request.method
         if method not in ("GET", "POST", "PUT", "DELETE", "OPTIONS", "WS", "HEAD"):
             return None
 
-        path = scope.get("path", "/")
+        raw_path = scope.get("path", "/")
+        subdomain = getattr(request, "subdomain", "_")
+
+        if self._memo_size:
+            key = (subdomain, method, raw_path)
+            hit = self._memo.get(key)
+            if hit is not None:
+                try:
+                    self._memo.move_to_end(key)
+                except KeyError:
+                    pass
+                self._memo_hits += 1
+                return _build_result(hit[0], dict(hit[1]))
+            self._memo_misses += 1
+
+        path = raw_path
         if path != "/":
             path = path.rstrip("/")
 
         if not is_safe_path(path):
             raise RuntimeError( 'Invalid path: path traversal detected')
 
-        subdomain = getattr(request, "subdomain", "_")
-
         for sub in [subdomain, "_"]:
-            if sub in self._routes and method in self._routes[sub]:
-                for route in self._routes[sub][method]:
-                    regex, params = route["regex"]
-                    match = regex.fullmatch(path)
-                    if match:
-                        args = {k: v.convert(match.group(k)) for k, v in params.items()}
-                        return _build_result(route, args)
+            tree = self._trees.get(sub, {}).get(method)
+            if tree is not None:
+                found = tree.match(path)
+                if found is not None:
+                    if self._memo_size:
+                        self._remember(key, found)
+                    return _build_result(found[0], dict(found[1]))
 
         return None
 
+    def _remember(self, key: tuple, found: tuple):
+        with self._lock:
+            self._memo[key] = found
+            while len(self._memo) > self._memo_size:
+                self._memo.popitem(last=False)
+
+    def compile(self) -> list:
+        """
+        freeze the registry: prepare every dispatch plan, order the lookup
+        trees and collect unreachable or overlapping routes.
+        :return: list of conflicts, also shown by summary()
+        """
+        with self._lock:
+            conflicts = []
+            for sub, methods in sorted(self._routes.items()):
+                for method, routes in sorted(methods.items()):
+                    for route in routes:
+                        try:
+                            route["plan"].prepare()
+                        except Exception as exc:
+                            conflicts.append(("broken", sub, method, route, repr(exc)))
+
+                    tree = self._trees[sub][method]
+                    tree.compile()
+                    for kind, route, other in tree.conflicts():
+                        conflicts.append((kind, sub, method, route, other["path"]))
+
+            self._conflicts = conflicts
+            self._frozen = True
+        return conflicts
+
+    @property
+    def frozen(self) -> bool:
+        return self._frozen
+
     @property
     def all(self) -> dict:
         return self._routes
@@ -80,7 +168,9 @@ class RouteRegistry:
                 self._subdomains_cache = list(self._routes.keys())
         return self._subdomains_cache
 
-    def summary(self) -> str:
+    def summary(self, stats: bool = False) -> str:
+        if stats:
+            return self._stats_summary()
         lines = []
         total = 0
         for sub, methods in sorted(self._routes.items()):
@@ -91,12 +181,72 @@ class RouteRegistry:
                     )
                     total += 1
         header = f"╔══ Route Registry: {total} routes registered ══╗"
+        if self._conflicts:
+            lines.append(self.report())
         return header + "\n" + "\n".join(lines)
 
+    def stats(self) -> list:
+        """per route metrics of this worker, slowest total time first"""
+        res = []
+        for sub, methods in self._routes.items():
+            for method, routes in methods.items():
+                for r in routes:
+                    res.append({
+                        "subdomain": sub,
+                        "method": method,
+                        "path": r["path"],
+                        "func": r.get("func", "?"),
+                        **r["stats"].as_dict(),
+                        "shed": r["admission"].shed if r.get("admission") else 0,
+                        **(r["cache"].stats() if r.get("cache") else {"hits": 0, "coalesced": 0, "stale": 0}),
+                    })
+        res.sort(key=lambda item: item["total"], reverse=True)
+        return res
+
+    def _stats_summary(self) -> str:
+        items = [item for item in self.stats() if item["count"]]
+        header = f"╔══ Route Stats: {len(items)} routes hit ══╗"
+        lines = [
+            f"  {'method':7s} {'path':40s} {'count':>8s} {'errors':>7s} "
+            f"{'total ms':>10s} {'avg ms':>8s} {'max ms':>8s} {'shed':>6s} "
+            f"{'c.hit':>6s} {'c.wait':>6s} {'stale':>6s}  histogram"
+        ]
+        for item in items:
+            host = "" if item["subdomain"] == "_" else f"[{item['subdomain']}] "
+            histogram = " ".join(
+                f"{'+inf' if b == float('inf') else f'{b * 1000:g}'}:{n}"
+                for b, n in zip(RouteStats.buckets, item["histogram"]) if n
+            )
+            lines.append(
+                f"  {item['method']:7s} {host + item['path']:40s} {item['count']:8d} "
+                f"{item['errors']:7d} {item['total'] * 1000:10.1f} "
+                f"{item['total'] * 1000 / item['count']:8.2f} {item['max'] * 1000:8.2f} "
+                f"{item['shed']:6d} {item['hits']:6d} {item['coalesced']:6d} {item['stale']:6d}  {histogram}"
+            )
+        return header + "\n" + "\n".join(lines)
+
+    def report(self) -> str:
+        lines = [f"╠══ {len(self._conflicts)} route conflicts ══╣"]
+        for kind, sub, method, route, other in self._conflicts:
+            host = "" if sub == "_" else f"[{sub}] "
+            reason = {
+                "unreachable": "shadowed by",
+                "overlap": "overlaps",
+                "broken": "cannot dispatch:",
+            }[kind]
+            lines.append(
+                f"  {kind:11s} {method:7s} {host}{route['path']} {reason} {other}"
+            )
+        return "\n".join(lines)
+
     def clear(self):
         with self._lock:
             self._routes.clear()
+            self._trees.clear()
             self._subdomains_cache = None
+            self._memo.clear()
+            self._conflicts = []
+            self._frozen = False
 
     @classmethod
     def reset(cls):
@@ -104,12 +254,400 @@ class RouteRegistry:
         cls._instance = None
 
 
+class RouteTree:
+    """
+    Segment trie of the routes registered for one (subdomain, method).
+    Static segments are resolved by dict lookup and typed params by their
+    convertor, so a lookup costs the depth of the path, not the number of
+    routes. Routes are numbered in registration order and the lowest
+    number that matches wins, exactly like the old linear scan.
+    Parameter-free routes live in a plain dict checked before the trie.
+    """
+
+    def __init__(self) -> None:
+        self._root = _Node()
+        self._static = {}
+        self._fallback = []
+        self._patterns = []
+        self._shadowed = []
+        self._count = 0
+
+    def insert(self, route: dict):
+        order = self._count
+        self._count += 1
+
+        if "{" not in route["path"]:
+            # a parameter-free path can only ever be reached by its exact
+            # string, unless an earlier route already matches it
+            found = self.match(route["path"])
+            if found is None:
+                self._static[route["path"]] = route
+            else:
+                self._shadowed.append((route, found[0]))
+            return
+
+        segments = _split(route["path"])
+        if any(_is_fallback(seg) for seg in segments):
+            # custom regex params may span "/", keep them on the full-path regex
+            self._fallback.append((order, route))
+            return
+
+        node = self._root
+        node.min_order = min(node.min_order, order)
+        for seg in segments:
+            node = node.child(seg)
+            node.min_order = min(node.min_order, order)
+        if node.route is None:
+            node.route = route
+            node.order = order
+        self._patterns.append((order, route, segments))
+
+    def compile(self):
+        """try the children most likely to win first, so pruning kicks in early"""
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            node.dynamic.sort(key=lambda child: child[3].min_order)
+            node.catchall.sort(key=lambda child: child[2].min_order)
+            stack.extend(node.static.values())
+            stack.extend(child[3] for child in node.dynamic)
+            stack.extend(child[2] for child in node.catchall)
+
+    def conflicts(self) -> list:
+        """
+        (kind, route, other) for every static route shadowed by an earlier
+        one and every pattern route covered by ("unreachable") or
+        overlapping with ("overlap") an earlier pattern route.
+        """
+        res = [("unreachable", route, other) for route, other in self._shadowed]
+        for order, route, segments in self._patterns:
+            kinds = [_kind(seg) for seg in segments]
+            seen = {}
+            for other_order, other, covers in _relations(self._root, kinds, 0, order, True):
+                prev = seen.get(other_order)
+                seen[other_order] = other, covers or (prev is not None and prev[1])
+
+            found = [seen[k] for k in sorted(seen)]
+            covered = [other for other, covers in found if covers]
+            if covered:
+                res.append(("unreachable", route, covered[0]))
+            else:
+                res.extend(("overlap", route, other) for other, _ in found)
+        return res
+
+    def match(self, path: str):
+        route = self._static.get(path)
+        if route is not None:
+            return route, {}
+
+        found = _search(self._root, _split(path), 0, _INF)
+        best = _INF if found is None else found[0]
+
+        for order, route in self._fallback:
+            if order >= best:
+                break
+            regex, params = route["regex"]
+            m = regex.fullmatch(path)
+            if m:
+                return route, {k: v.convert(m.group(k)) for k, v in params.items()}
+
+        if found is None:
+            return None
+        return found[1], dict(found[2])
+
+
+_INF = float("inf")
+
+
+class _Node:
+    __slots__ = ("static", "dynamic", "catchall", "route", "order", "min_order")
+
+    def __init__(self) -> None:
+        self.static = {}
+        self.dynamic = []
+        self.catchall = []
+        self.route = None
+        self.order = _INF
+        self.min_order = _INF
+
+    def child(self, segment: str) -> "_Node":
+        if "{" not in segment:
+            if segment not in self.static:
+                self.static[segment] = _Node()
+            return self.static[segment]
+
+        for seg, _, _, node in self.dynamic:
+            if seg == segment:
+                return node
+        for seg, _, node in self.catchall:
+            if seg == segment:
+                return node
+
+        match = PARAM_REGEX.fullmatch(segment)
+        node = _Node()
+        if match and (match.group(2) or "").lstrip(":") == "path":
+            self.catchall.append((segment, match.group(1), node))
+        elif match:
+            convertor = CONVERTOR_TYPES[(match.group(2) or ":str").lstrip(":")]
+            self.dynamic.append((segment, match.group(1), convertor, node))
+        else:
+            self.dynamic.append((segment, None, build_path(segment), node))
+        return node
+
+
+def _split(path: str) -> list:
+    return path.split("/")[1:]
+
+
+def _is_fallback(segment: str) -> bool:
+    if "{" not in segment:
+        return False
+    params = list(PARAM_REGEX.finditer(segment))
+    for match in params:
+        typ = (match.group(2) or ":str").lstrip(":")
+        if typ not in CONVERTOR_TYPES:
+            return True
+        if typ == "path" and (len(params) > 1 or match.group(0) != segment):
+            return True
+    return False
+
+
+# convertor pairs that can never match the same segment
+_DISJOINT = {
+    frozenset(("bool", "int")),
+    frozenset(("bool", "float")),
+    frozenset(("bool", "oid")),
+}
+
+
+def _kind(segment: str) -> tuple:
+    if "{" not in segment:
+        return "static", segment
+    match = PARAM_REGEX.fullmatch(segment)
+    if match:
+        typ = (match.group(2) or ":str").lstrip(":")
+        return ("catchall", typ) if typ == "path" else ("param", typ)
+    return "mixed", build_path(segment)[0]
+
+
+def _segment_relation(a: tuple, b: tuple):
+    """how the earlier segment a relates to b: "covers", "overlaps" or None"""
+    if a[0] == "static":
+        if b[0] == "static":
+            return "covers" if a[1] == b[1] else None
+        if not a[1]:
+            return None
+        if b[0] == "param":
+            return "overlaps" if _fullmatch(CONVERTOR_TYPES[b[1]], a[1]) else None
+        return "overlaps" if b[1].fullmatch(a[1]) else None
+
+    if a[0] == "param":
+        if b[0] == "static":
+            if b[1] and _fullmatch(CONVERTOR_TYPES[a[1]], b[1]):
+                return "covers"
+            return None
+        if b[0] == "param":
+            if a[1] == b[1] or a[1] == "str" or (a[1], b[1]) == ("float", "int"):
+                return "covers"
+            if frozenset((a[1], b[1])) in _DISJOINT:
+                return None
+            return "overlaps"
+        return "covers" if a[1] == "str" else "overlaps"
+
+    if b[0] == "static":
+        return "covers" if a[1].fullmatch(b[1]) else None
+    if b[0] == "mixed" and a[1].pattern == b[1].pattern:
+        return "covers"
+    return "overlaps"
+
+
+def _relations(node: _Node, kinds: list, i: int, order, covers: bool):
+    """yield (order, route, covers) of earlier routes sharing paths with kinds"""
+    if node.min_order >= order:
+        return
+
+    if i == len(kinds):
+        if node.order < order:
+            yield node.order, node.route, covers
+        return
+
+    kind = kinds[i]
+    if kind[0] == "catchall":
+        # a path param matches this segment alone or this one and more
+        children = [(("static", seg), child) for seg, child in node.static.items() if seg]
+        children += [(_kind(seg), child) for seg, _, _, child in node.dynamic]
+        for _, child in children:
+            yield from _relations(child, kinds, i + 1, order, False)
+            yield from _relations(child, kinds, i, order, False)
+    else:
+        if kind[0] == "static":
+            child = node.static.get(kind[1])
+            if child is not None:
+                yield from _relations(child, kinds, i + 1, order, covers)
+        else:
+            for seg, child in node.static.items():
+                if _segment_relation(("static", seg), kind):
+                    yield from _relations(child, kinds, i + 1, order, False)
+        for seg, _, _, child in node.dynamic:
+            relation = _segment_relation(_kind(seg), kind)
+            if relation:
+                yield from _relations(child, kinds, i + 1, order, covers and relation == "covers")
+
+    for _, _, child in node.catchall:
+        j = i
+        while j < len(kinds) and (kinds[j][0] != "static" or kinds[j][1]):
+            j += 1
+            yield from _relations(child, kinds, j, order, covers)
+
+
+def _search(node: _Node, segments: list, i: int, best):
+    """Return (order, route, args) of the earliest route below node, or None."""
+    if node.min_order >= best:
+        return None
+
+    if i == len(segments):
+        if node.order < best:
+            return node.order, node.route, ()
+        return None
+
+    found = None
+    segment = segments[i]
+
+    child = node.static.get(segment)
+    if child is not None:
+        found = _search(child, segments, i + 1, best)
+        if found is not None:
+            best = found[0]
+
+    for _, name, convertor, child in node.dynamic:
+        if child.min_order >= best:
+            continue
+        if name is None:
+            regex, params = convertor
+            m = regex.fullmatch(segment)
+            if not m:
+                continue
+            args = tuple((k, v.convert(m.group(k))) for k, v in params.items())
+        else:
+            if not segment or not _fullmatch(convertor, segment):
+                continue
+            args = ((name, convertor.convert(segment)),)
+        res = _search(child, segments, i + 1, best)
+        if res is not None:
+            found = res[0], res[1], args + res[2]
+            best = found[0]
+
+    end = i
+    while end < len(segments) and segments[end]:
+        end += 1
+    for _, name, child in node.catchall:
+        # longest first: a path param is greedy like its regex ".*"
+        for j in range(end, i, -1):
+            if child.min_order >= best:
+                break
+            res = _search(child, segments, j, best)
+            if res is not None:
+                value = "/".join(segments[i:j])
+                found = res[0], res[1], ((name, value),) + res[2]
+                best = found[0]
+
+    return found
+
+
+def _fullmatch(convertor, segment: str) -> bool:
+    if convertor.pattern is None:
+        return True
+    return convertor.pattern.fullmatch(segment) is not None
+
+
+class RouteStats:
+    """
+    Request count, errors and latency of one route entry. Only touched
+    from the worker's event loop, so plain counters need no lock.
+    """
+    __slots__ = ("count", "errors", "total", "max", "histogram")
+
+    # upper bounds in seconds
+    buckets = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float("inf"))
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = [0] * len(self.buckets)
+
+    def record(self, elapsed: float, error: bool = False):
+        self.count += 1
+        if error:
+            self.errors += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+        self.histogram[bisect_left(self.buckets, elapsed)] += 1
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "total": self.total,
+            "max": self.max,
+            "histogram": list(self.histogram),
+        }
+
+
+class DispatchPlan:
+    """
+    What App needs to call a route, worked out once (by
+    RouteRegistry.compile or on first dispatch) instead of introspecting
+    the controller on every request.
+    """
+    __slots__ = ("controller", "func", "executor", "ready", "with_request", "wants_request", "is_async")
+
+    def __init__(self, controller, func, executor=None) -> None:
+        self.controller = controller
+        self.func = func
+        self.executor = executor
+        self.ready = False
+
+    def prepare(self):
+        if self.controller is not None:
+            self.with_request = 'request' in inspect.getfullargspec(self.controller.__init__).args
+            method = getattr(self.controller, self.func)
+        else:
+            self.with_request = False
+            method = self.func
+        self.wants_request = 'request' in method.__code__.co_varnames
+        self.is_async = inspect.iscoroutinefunction(method)
+        if self.executor == "process" and (self.is_async or self.with_request or self.wants_request):
+            raise ValueError("executor='process' needs a sync handler that does not take the request")
+        self.ready = True
+
+    def target(self):
+        """picklable callable for the process executor, the controller is built in the child"""
+        if not self.ready:
+            self.prepare()
+        if self.controller is None:
+            return self.func
+        return functools.partial(_call_controller, self.controller, self.func)
+
+    def bind(self, request):
+        if not self.ready:
+            self.prepare()
+        if self.controller is None:
+            return self.func
+        if self.with_request:
+            return getattr(self.controller(request), self.func)
+        return getattr(self.controller(), self.func)
+
+
 class Router:
     def __init__(
         self,
         prefix: str = "",
         middlewares: list[Callable]|None = None,
         subdomain:str|None = None,
+        limiter: str|None = None,
     ) -> None:
         if middlewares is None:
             middlewares = []
@@ -120,26 +658,53 @@ class Router:
         self._prefix = prefix
         self._middlewares = middlewares
         self._subdomain = subdomain or "_"
+        self._limiter = limiter
         self._registry = RouteRegistry()
 
     def _add(
-        self, path: str, controller, func, method: str, middlewares=None, cache=None
+        self, path: str, controller, func, method: str, middlewares=None, cache=None, body=None,
+        raw_fields=None, timeout=None, limit=None, limiter=None, executor=None,
+        stale=0, stale_if_error=0, vary=None,
     ):
         if middlewares is None:
             middlewares = []
+        if body is not None and body not in BODY_MODES:
+            raise ValueError(f"body must be one of {', '.join(BODY_MODES)}")
+        if executor is not None and executor not in EXECUTORS:
+            raise ValueError(f"executor must be one of {', '.join(EXECUTORS)}")
 
         full_path = full_path_builder(self._prefix, path)
         all_middlewares = self._middlewares.copy() + middlewares
+        plan = DispatchPlan(controller, func, executor)
+        if executor == "process":
+            # a handler that cannot run in a process fails here, not on every request
+            plan.prepare()
 
         entry = {
             "path": full_path,
             "controller": controller,
             "func": func,
             "middlewares": all_middlewares,
-            "regex": build_path(full_path),
+            "regex": build_path(full_path) if "{" in full_path else None,
+            "plan": plan,
+            "stats": RouteStats(),
         }
         if cache:
-            entry["cache"] = cache
+            # imported here, the cache drivers read Config('app') on import
+            from renus.core.routecache import RouteCache
+            entry["cache"] = RouteCache(cache, stale, stale_if_error, vary)
+        if body is not None:
+            entry["body"] = body
+        if raw_fields:
+            entry["raw_fields"] = frozenset(raw_fields)
+        if timeout:
+            entry["timeout"] = timeout
+        if limit:
+            entry["admission"] = limit if isinstance(limit, Admission) else Admission(limit)
+        if limiter or self._limiter:
+            entry["limiter"] = limiter or self._limiter
+        if executor == "process":
+            entry["executor"] = executor
 
         self._registry.register(self._subdomain, method, entry)
 
@@ -150,8 +715,16 @@ class Router:
         func:Callable|str|None=None,
         middlewares: list[Callable]|None = None,
         cache: int|None = None,
+        stale: int = 0,
+        stale_if_error: int = 0,
+        vary: list[str]|None = None,
+        timeout: float|None = None,
+        limit: int|Admission|None = None,
+        limiter: str|None = None,
+        executor: str|None = None,
     ):
-        self._add(path, controller, func, "GET", middlewares, cache)
+        self._add(path, controller, func, "GET", middlewares, cache, timeout=timeout, limit=limit, limiter=limiter,
+                  executor=executor, stale=stale, stale_if_error=stale_if_error, vary=vary)
         return self
 
     def head(
@@ -161,8 +734,16 @@ class Router:
         func:Callable|str|None=None,
         middlewares: list[Callable]|None = None,
         cache: int|None = None,
+        stale: int = 0,
+        stale_if_error: int = 0,
+        vary: list[str]|None = None,
+        timeout: float|None = None,
+        limit: int|Admission|None = None,
+        limiter: str|None = None,
+        executor: str|None = None,
     ):
-        self._add(path, controller, func, "HEAD", middlewares, cache)
+        self._add(path, controller, func, "HEAD", middlewares, cache, timeout=timeout, limit=limit, limiter=limiter,
+                  executor=executor, stale=stale, stale_if_error=stale_if_error, vary=vary)
         return self
 
     def post(
@@ -171,8 +752,15 @@ class Router:
         controller:Callable | None= None,
         func:Callable|str|None=None,
         middlewares: list[Callable]|None = None,
+        body: str = "safe",
+        raw_fields: list[str]|None = None,
+        timeout: float|None = None,
+        limit: int|Admission|None = None,
+        limiter: str|None = None,
+        executor: str|None = None,
     ):
-        self._add(path, controller, func, "POST", middlewares)
+        self._add(path, controller, func, "POST", middlewares, body=body, raw_fields=raw_fields,
+                  timeout=timeout, limit=limit, limiter=limiter, executor=executor)
         return self
 
     def put(
@@ -181,8 +769,15 @@ class Router:
         controller:Callable | None= None,
         func:Callable|str|None=None,
         middlewares: list[Callable]|None = None,
+        body: str = "safe",
+        raw_fields: list[str]|None = None,
+        timeout: float|None = None,
+        limit: int|Admission|None = None,
+        limiter: str|None = None,
+        executor: str|None = None,
     ):
-        self._add(path, controller, func, "PUT", middlewares)
+        self._add(path, controller, func, "PUT", middlewares, body=body, raw_fields=raw_fields,
+                  timeout=timeout, limit=limit, limiter=limiter, executor=executor)
         return self
 
     def delete(
@@ -191,8 +786,15 @@ class Router:
         controller:Callable | None= None,
         func:Callable|str|None=None,
         middlewares: list[Callable]|None = None,
+        body: str = "safe",
+        raw_fields: list[str]|None = None,
+        timeout: float|None = None,
+        limit: int|Admission|None = None,
+        limiter: str|None = None,
+        executor: str|None = None,
     ):
-        self._add(path, controller, func, "DELETE", middlewares)
+        self._add(path, controller, func, "DELETE", middlewares, body=body, raw_fields=raw_fields,
+                  timeout=timeout, limit=limit, limiter=limiter, executor=executor)
         return self
 
     def option(
@@ -201,8 +803,12 @@ class Router:
         controller:Callable | None= None,
         func:Callable|str|None=None,
         middlewares: list[Callable]|None = None,
+        timeout: float|None = None,
+        limit: int|Admission|None = None,
+        limiter: str|None = None,
+        executor: str|None = None,
     ):
-        self._add(path, controller, func, "OPTIONS", middlewares)
+        self._add(path, controller, func, "OPTIONS", middlewares, timeout=timeout, limit=limit, limiter=limiter, executor=executor)
         return self
 
     def ws(
@@ -249,6 +855,23 @@ class Router:
         return self
 
 
+# how App reads a POST/PUT/DELETE body before calling the handler:
+# safe   parse and sanitise into request.inputs up front
+# lazy   buffer the body, parse and sanitise on first access of request.inputs
+# raw    buffer the body only, the handler reads `await request.body()`
+# stream leave the body unread for `request.stream()`
+# raw_fields lists dotted keys ("content", "items.html") kept unsanitised
+BODY_MODES = ("safe", "lazy", "raw", "stream")
+
+# where App runs a sync handler: the thread pool, or the process pool for
+# CPU bound work (arguments and result pickled, no request available)
+EXECUTORS = ("thread", "process")
+
+
+def _call_controller(controller, func: str, **kwargs):
+    return getattr(controller(), func)(**kwargs)
+
+
 def _build_result(route: dict, args: dict) -> dict:
     """ساخت نتیجه route match شده"""
     return {
@@ -258,6 +881,14 @@ def _build_result(route: dict, args: dict) -> dict:
         "func": route["func"],
         "middlewares": route["middlewares"],
         "cache": route.get("cache", None),
+        "body": route.get("body", "safe"),
+        "raw_fields": route.get("raw_fields", None),
+        "timeout": route.get("timeout", None),
+        "limiter": route.get("limiter", None),
+        "executor": route.get("executor", "thread"),
+        "admission": route.get("admission", None),
+        "plan": route["plan"],
+        "stats": route["stats"],
     }
 
 
@@ -266,6 +897,7 @@ PARAM_REGEX = re.compile(r"\{([a-zA-Z_][a-zA-Z0-9_]*)(:[^/\{]*)?\}")
 
 class StringConvertor:
     regex = r"[^/]+"
+    pattern = None
 
     def convert(self, value: str) -> str:
         return str(value)
@@ -273,6 +905,7 @@ class StringConvertor:
 
 class PathConvertor:
     regex = r"[^/]+(?:/[^/]+)*"
+    pattern = re.compile(regex)
 
     def convert(self, value: str) -> str:
         return str(value)
@@ -280,6 +913,7 @@ class PathConvertor:
 
 class IntegerConvertor:
     regex = r"[0-9]+"
+    pattern = re.compile(regex)
 
     def convert(self, value: str) -> int:
         return int(value)
@@ -287,6 +921,7 @@ class IntegerConvertor:
 
 class FloatConvertor:
     regex = r"[0-9]+(\.[0-9]+)?"
+    pattern = re.compile(regex)
 
     def convert(self, value: str) -> float:
         return float(value)
@@ -294,6 +929,7 @@ class FloatConvertor:
 
 class OIdConvertor:
     regex = r"[a-f0-9]{24}"
+    pattern = re.compile(regex)
 
     def convert(self, value: str):
         return ObjectId(value)
@@ -301,6 +937,7 @@ class OIdConvertor:
 
 class BoolConvertor:
     regex = r"(true)|(false)"
+    pattern = re.compile(regex)
 
     def convert(self, value: str) -> bool:
         return value == "true"
@@ -11,7 +11,8 @@ setup(
     packages=find_packages(),
     include_package_data=True,
     python_requires=">=3.10",
-    install_requires=['anyio', 'python-multipart', 'pymongo', 'requests'],
+    install_requires=['anyio>=4.1', 'python-multipart', 'pymongo', 'requests'],
+    extras_require={'serve': ['uvicorn', 'uvloop', 'httptools']},
     entry_points={
             'console_scripts': [
                 'renus=renus.commands.run:main',